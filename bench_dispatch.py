@@ -0,0 +1,99 @@
+# ================================
+# Mikro-benchmark: bitta xabarni holat handleriga yetkazish vaqti.
+#
+#   python bench_dispatch.py [updates_soni]
+#
+# Uch xil marshrutlash solishtiriladi (har birida 12 ta holat):
+#   lambda  – eski usul: user_states dict + lambda filtrlar zanjiri
+#   fsm     – aiogram StateFilter zanjiri
+#   table   – StateDispatch: holat -> handler, bitta qidiruv
+# Tarmoq ishlatilmaydi, handlerlar hech narsa yubormaydi.
+import asyncio
+import datetime
+import sys
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Chat, Message, Update, User
+
+from state_router import StateDispatch
+
+STATE_NAMES = [
+    "ask_new_head_id", "ASK_FULLNAME", "ASK_TABEL", "ASK_PHOTO", "choose_worker",
+    "edit_worker_field", "edit_fullname", "edit_tabel", "edit_photo", "edit_more",
+    "delete_worker", "waiting_for_number",
+]
+Bench = type("Bench", (StatesGroup,), {name: State() for name in STATE_NAMES})
+USER_ID = 123456789
+
+
+async def handler(message, state=None):
+    pass
+
+
+def make_update(update_id):
+    message = Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=USER_ID, type="private"),
+        from_user=User(id=USER_ID, is_bot=False, first_name="Bench"),
+        text="12345",
+    )
+    return Update(update_id=update_id, message=message)
+
+
+def build_lambda(position):
+    dp = Dispatcher()
+    user_states = {USER_ID: {"state": STATE_NAMES[position]}}
+    for name in STATE_NAMES:
+        dp.message.register(handler, lambda m, name=name: user_states.get(m.from_user.id, {}).get("state") == name)
+    return dp, None
+
+
+def build_fsm(position):
+    dp = Dispatcher()
+    for name in STATE_NAMES:
+        dp.message.register(handler, getattr(Bench, name))
+    return dp, getattr(Bench, STATE_NAMES[position])
+
+
+def build_table(position):
+    dp = Dispatcher()
+    table = StateDispatch()
+    for name in STATE_NAMES:
+        table(getattr(Bench, name))(handler)
+    table.attach(dp.message)
+    return dp, getattr(Bench, STATE_NAMES[position])
+
+
+async def measure(build, position, count):
+    bot = Bot(token="42:BENCHMARK")
+    dp, state = build(position)
+    if state is not None:
+        await dp.fsm.get_context(bot, USER_ID, USER_ID).set_state(state)
+
+    updates = [make_update(i) for i in range(count)]
+    for update in updates[:200]:  # isitish
+        await dp.feed_update(bot, update)
+
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+    return elapsed / count * 1e6
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{count} ta update, mikrosoniya / update")
+    print(f"{'usul':<8}{'birinchi holat':>16}{'oxirgi holat':>16}")
+    for name, build in (("lambda", build_lambda), ("fsm", build_fsm), ("table", build_table)):
+        first = await measure(build, 0, count)
+        last = await measure(build, len(STATE_NAMES) - 1, count)
+        print(f"{name:<8}{first:>16.1f}{last:>16.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
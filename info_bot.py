@@ -1,39 +1,379 @@
 import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+import weakref
+from contextlib import asynccontextmanager
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.utils.media_group import MediaGroupBuilder
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 import asyncpg
+from cachetools import LRUCache, TTLCache
 from decouple import config
+from migrate import migrate
+import queries
+import roster
+from state_router import StateDispatch
 # ================================
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder
 # ================================
 # Telegram & Guruh konfiguratsiyasi
 API_TOKEN = config("API_TOKEN")
 GROUP_ID = int(config("GROUP_ID"))
 SUPERADMINS = [int(x) for x in config("SUPERADMINS").split(",")]
 
+# Ishga tushirish rejimi: "polling" yoki "webhook"
+BOT_MODE = config("BOT_MODE", default="polling")
+WEBHOOK_URL = config("WEBHOOK_URL", default="")  # masalan https://bot.example.uz
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="/webhook")
+WEBHOOK_HOST = config("WEBHOOK_HOST", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8080, cast=int)
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="")
+
 # ================================
 DB_USER = config("DB_USER")
 DB_PASSWORD = config("DB_PASSWORD")
 DB_HOST = config("DB_HOST")
 DB_PORT = config("DB_PORT", cast=int)
 DB_NAME = config("DB_NAME")
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", default=2, cast=int)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", default=10, cast=int)
+DB_ACQUIRE_TIMEOUT = config("DB_ACQUIRE_TIMEOUT", default=10, cast=float)
+DB_MAX_QUERIES = config("DB_MAX_QUERIES", default=50000, cast=int)
+DB_CONN_LIFETIME = config("DB_CONN_LIFETIME", default=300, cast=float)
+# Registrdan tashqari so‘rovlar uchun statement keshidagi joy
+DB_STATEMENT_CACHE = config("DB_STATEMENT_CACHE", default=100, cast=int)
+HEAD_CACHE_TTL = config("HEAD_CACHE_TTL", default=600, cast=int)
+HEAD_CACHE_SIZE = config("HEAD_CACHE_SIZE", default=10000, cast=int)
+STATE_TTL = config("STATE_TTL", default=3600, cast=int)
+STATE_MAX_USERS = config("STATE_MAX_USERS", default=10000, cast=int)
+# FSM holatlari qayerda saqlanadi: "memory" yoki "postgres"
+FSM_STORAGE = config("FSM_STORAGE", default="memory")
+# Bir vaqtda qayta ishlanadigan update lar soni (polling)
+UPDATE_CONCURRENCY = config("UPDATE_CONCURRENCY", default=64, cast=int)
+
+# Telegram limitlari: jami ~30 xabar/soniya, bitta chatga ~1 xabar/soniya,
+# guruhga 20 xabar/daqiqa
+TG_GLOBAL_RATE = config("TG_GLOBAL_RATE", default=30, cast=float)
+TG_CHAT_RATE = config("TG_CHAT_RATE", default=1, cast=float)
+TG_CHAT_BURST = config("TG_CHAT_BURST", default=3, cast=int)
+TG_GROUP_RATE_PER_MIN = config("TG_GROUP_RATE_PER_MIN", default=20, cast=float)
+TG_MAX_RETRIES = config("TG_MAX_RETRIES", default=3, cast=int)
+# Guruh xabarlari navbati
+NOTIFY_QUEUE_SIZE = config("NOTIFY_QUEUE_SIZE", default=1000, cast=int)
+NOTIFY_DRAIN_TIMEOUT = config("NOTIFY_DRAIN_TIMEOUT", default=15, cast=float)
+# Digest rejimi: bitta bekat xabarlari oyna davomida bitta xabarga yig‘iladi
+NOTIFY_DIGEST = config("NOTIFY_DIGEST", default=False, cast=bool)
+NOTIFY_DIGEST_WINDOW = config("NOTIFY_DIGEST_WINDOW", default=60, cast=float)
+# Fayldan import: bitta fayldagi eng ko‘p qatorlar soni
+IMPORT_MAX_ROWS = config("IMPORT_MAX_ROWS", default=5000, cast=int)
+
+logger = logging.getLogger("info_bot")
 
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
+
+
+# ================================
+# Chiquvchi xabarlar: tezlik cheklovi (token bucket) va navbat.
+# Har bir Bot API so‘rovi shu middleware orqali o‘tadi: avval chat limiti,
+# keyin umumiy limit kutiladi. Umumiy limit uchun navbat ustuvorlik bo‘yicha:
+# foydalanuvchiga javoblar guruh xabarlaridan oldin yuboriladi.
+# 429 (RetryAfter) kelsa, chat to‘xtatiladi va so‘rov qayta yuboriladi.
+PRIORITY_USER, PRIORITY_NOTIFY = 0, 1
+send_priority = contextvars.ContextVar("send_priority", default=PRIORITY_USER)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self):
+        # Tokenni band qilamiz; u bo‘shashigacha qancha kutish kerakligini qaytaramiz
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def block(self, seconds):
+        # Keyingi token aynan `seconds` dan keyin bo‘shaydi
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class PriorityGate:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.waiters = []
+        self.counter = itertools.count()
+        self.task = None
+
+    async def acquire(self, priority):
+        if not self.waiters and self.bucket.wait_time() == 0:
+            self.bucket.reserve()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._release())
+        await future
+
+    async def _release(self):
+        while self.waiters:
+            wait = self.bucket.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():  # kutayotgan so‘rov bekor qilingan
+                continue
+            self.bucket.reserve()
+            future.set_result(None)
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    LIMITED = ("Send", "Forward", "Copy", "Edit")
+
+    def __init__(self):
+        self.gate = PriorityGate(TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE))
+        # Faol bo‘lmagan chatlarning bucketlari o‘zi tozalanadi
+        self.chats = TTLCache(maxsize=10000, ttl=120)
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, str) or chat_id < 0:  # guruh yoki kanal
+                bucket = TokenBucket(TG_GROUP_RATE_PER_MIN / 60, TG_CHAT_BURST)
+            else:
+                bucket = TokenBucket(TG_CHAT_RATE, TG_CHAT_BURST)
+            self.chats[chat_id] = bucket
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        if not type(method).__name__.startswith(self.LIMITED):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in itertools.count():
+            if chat_id is not None:
+                delay = self.chat_bucket(chat_id).reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+            await self.gate.acquire(send_priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= TG_MAX_RETRIES:
+                    raise
+                logger.warning("Flood limit (chat %s): %s s kutamiz", chat_id, e.retry_after)
+                if chat_id is not None:
+                    self.chat_bucket(chat_id).block(e.retry_after)
+                else:
+                    self.gate.bucket.block(e.retry_after)
+
+
+outbound_limiter = OutboundLimiter()
+bot.session.middleware(outbound_limiter)
+
 
 # ---------------- Helper: Guruhga xabar yuborish ----------------
-async def send_to_group(text: str):
+# Handler xabarni navbatga qo‘yadi va darhol qaytadi; fon vazifasi (worker)
+# navbatdagi xabarlarni guruhga yuboradi. Navbat to‘lsa xabar tashlab
+# yuboriladi (dropped), to‘xtashda navbat oxirigacha yuboriladi (drain).
+# Digest rejimida bekat xabarlari NOTIFY_DIGEST_WINDOW soniya yig‘ilib,
+# bitta (4096 belgidan oshsa bir nechta) xabar bo‘lib navbatga tushadi.
+class GroupNotifier:
+    def __init__(self, maxsize=NOTIFY_QUEUE_SIZE, digest=NOTIFY_DIGEST, window=NOTIFY_DIGEST_WINDOW):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.task = None
+        self.digest = digest
+        self.window = window
+        self.pending = {}  # station_id -> [matnlar]
+        self.timers = {}
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "coalesced": 0}
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, text, station_id=None):
+        if self.digest and station_id is not None:
+            texts = self.pending.setdefault(station_id, [])
+            texts.append(text)
+            if len(texts) == 1:
+                self.timers[station_id] = asyncio.get_running_loop().call_later(
+                    self.window, self.flush, station_id
+                )
+            return
+        self._enqueue(text)
+
+    def flush(self, station_id):
+        timer = self.timers.pop(station_id, None)
+        if timer is not None:
+            timer.cancel()
+        texts = self.pending.pop(station_id, None)
+        if not texts:
+            return
+        if len(texts) == 1:
+            return self._enqueue(texts[0])
+
+        self.stats["coalesced"] += len(texts)
+        header = f"🗂 {len(texts)} ta yangilanish (so‘nggi {self.window:g} soniya):"
+        for chunk in split_text([header, *texts], sep="\n\n"):
+            self._enqueue(chunk)
+
+    def _enqueue(self, text):
+        try:
+            self.queue.put_nowait(text)
+            self.stats["queued"] += 1
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.error("Guruh navbati to‘ldi, xabar tashlandi: %s", text[:100])
+
+    async def _run(self):
+        # Guruh xabarlari past ustuvorlikda: foydalanuvchi javoblari oldin ketadi
+        send_priority.set(PRIORITY_NOTIFY)
+        while True:
+            text = await self.queue.get()
+            try:
+                await self._deliver(text)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, text):
+        try:
+            await bot.send_message(GROUP_ID, text)
+            self.stats["sent"] += 1
+        except TelegramRetryAfter as e:
+            # Limit tugamagan – adminlarga ham yozib, yukni oshirmaymiz
+            self.stats["failed"] += 1
+            logger.error("Guruhga yuborilmadi (flood limit): %s", e)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error("Guruhga yuborilmadi: %s", e)
+            for admin in SUPERADMINS:
+                try:
+                    await bot.send_message(admin, f"❌ Guruhga yuborilmadi:\n{text}\n\nXato: {e}")
+                except:
+                    pass
+
+    async def stop(self, timeout=NOTIFY_DRAIN_TIMEOUT):
+        # Yig‘ilgan digestlarni kutmasdan navbatga qo‘yamiz
+        for station_id in list(self.pending):
+            self.flush(station_id)
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Guruh navbatida %s ta xabar yuborilmay qoldi", self.queue.qsize())
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        logger.info("Guruh xabarlari: %s", self.stats)
+
+
+notifier = GroupNotifier()
+
+
+def send_to_group(text: str, station_id=None):
+    notifier.put(text, station_id)
+
+# ---------------- Helper: uzun ro‘yxatlarni bo‘lib yuborish ----------------
+MEDIA_GROUP_SIZE = 10   # sendMediaGroup da ko‘pi bilan 10 ta rasm
+TEXT_LIMIT = 4096       # bitta xabar uzunligi chegarasi
+
+
+def split_text(lines, limit=TEXT_LIMIT, sep="\n"):
+    chunks, current = [], ""
+    for line in lines:
+        while len(line) > limit:  # juda uzun qatorni kesamiz
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + len(sep) + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}{sep}{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def worker_caption(idx, w):
+    return (f"{idx}. 👤 {w['full_name']}\n"
+            f"   🔢 Tabel: {w['tabel']}\n"
+            f"   💼 Lavozim: {w['position']}\n"
+            f"   🕒 Smena: {w['smena']}")
+
+
+# URL rasm birinchi yuborilganda Telegram uni yuklab oladi; qaytgan file_id
+# saqlanadi va keyingi safar URL o‘rniga ishlatiladi (tez, manba serverga bog‘liq emas).
+def worker_photo(w):
+    return w["photo_file_id"] or w["photo"]
+
+
+async def remember_photo_file_ids(sent_pairs):
+    # sent_pairs: [(xodim, yuborilgan Message)]
+    updates = [
+        (w["id"], w["photo"], sent.photo[-1].file_id)
+        for w, sent in sent_pairs
+        if not w["photo_file_id"] and w["photo"].startswith(("http://", "https://")) and sent.photo
+    ]
+    if not updates:
+        return
+    ids, photos, file_ids = (list(col) for col in zip(*updates))
     try:
-        await bot.send_message(GROUP_ID, text)
+        await db.execute(queries.WORKERS_SET_PHOTO_FILE_IDS, ids, photos, file_ids)
     except Exception as e:
-        for admin in SUPERADMINS:
-            try:
-                await bot.send_message(admin, f"❌ Guruhga yuborilmadi:\n{text}\n\nXato: {e}")
-            except:
-                pass
+        logger.warning("Rasm file_id saqlanmadi: %s", e)
+
+
+async def send_worker_album(message, items):
+    # items: [(tartib_raqami, xodim)], har biri rasmli. 10 tadan albom.
+    sent_pairs = []
+    for i in range(0, len(items), MEDIA_GROUP_SIZE):
+        chunk = items[i:i + MEDIA_GROUP_SIZE]
+        if len(chunk) == 1:  # albomda kamida 2 ta rasm bo‘lishi kerak
+            idx, w = chunk[0]
+            sent = await message.answer_photo(photo=worker_photo(w), caption=worker_caption(idx, w))
+            sent_pairs.append((w, sent))
+            continue
+        album = MediaGroupBuilder()
+        for idx, w in chunk:
+            album.add_photo(media=worker_photo(w), caption=worker_caption(idx, w))
+        sent = await message.answer_media_group(album.build())
+        sent_pairs.extend(zip((w for _, w in chunk), sent))
+    await remember_photo_file_ids(sent_pairs)
+
 
 # ================================
 # Boshlang'ich keyboard yangilanadi
@@ -48,10 +388,210 @@ main_kb = ReplyKeyboardMarkup(
 )
 
 # Holatlar
-user_states = {}
+# Suhbat holatlari xotirasi: har bir yozuv STATE_TTL soniya ishlatilmasa
+# o‘chadi, STATE_MAX_USERS dan oshsa eng eski (LRU) yozuv chiqariladi.
+class ConversationStore(TTLCache):
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        # O‘qilganda muddat yangilanadi (sliding TTL)
+        self[key] = value
+        return value
+
+
 ASK_FULLNAME, ASK_PHONE, ASK_OFFICE, ASK_POSITION = range(4)
 
-db_conn = None  # global connection
+# ================================
+# Baza: ulanishlar puli (pool). Har bir so‘rov puldan bo‘sh ulanish oladi,
+# shuning uchun bir nechta boshliqning so‘rovlari parallel bajariladi.
+# queries.py dagi so‘rovlar har bir ulanish ochilganda oldindan tayyorlanadi
+# (prepare) va asyncpg ning statement keshiga qo‘yiladi, conn.fetch() shu
+# rejani qayta ishlatadi. asyncpg ning ochiq API si bunga imkon bermaydi:
+# Connection.prepare() keshni chetlab o‘tadi, PreparedStatement esa ulanish
+# pulga qaytishi bilan yaroqsiz bo‘ladi. Shuning uchun fetch() ning o‘zi
+# ishlatadigan Connection._get_statement chaqiriladi (asyncpg 0.30).
+class RegistryConnection(asyncpg.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()  # keshdagi registr so‘rovlari
+        self.stats = {"prepares": 0, "prepare_ms": 0.0, "reused": 0}
+
+    async def prepare_registry(self):
+        for query in queries.REGISTRY.values():
+            await self.prepare_cached(query)
+
+    async def prepare_cached(self, query):
+        started = time.perf_counter()
+        await self._get_statement(query, None)
+        self.prepared.add(query)
+        self.stats["prepares"] += 1
+        self.stats["prepare_ms"] += (time.perf_counter() - started) * 1000
+
+
+class Database:
+    def __init__(self):
+        self.pool = None
+        # Sxema (migratsiyalar) tayyor bo‘lmaguncha prepare qilib bo‘lmaydi
+        self.ready = False
+        self.connections = weakref.WeakSet()
+        self.stats = {"calls": 0}
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            user=DB_USER, password=DB_PASSWORD,
+            host=DB_HOST, port=DB_PORT, database=DB_NAME,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            # Ulanishlarni qayta yaratish (recycling)
+            max_queries=DB_MAX_QUERIES,
+            max_inactive_connection_lifetime=DB_CONN_LIFETIME,
+            connection_class=RegistryConnection,
+            init=self.init_connection,
+            # Registr keshdan siqib chiqarilmasin va muddati o‘tib o‘chmasin
+            statement_cache_size=len(queries.REGISTRY) + DB_STATEMENT_CACHE,
+            max_cached_statement_lifetime=0,
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def acquire(self):
+        return self.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+
+    async def init_connection(self, conn):
+        self.connections.add(conn)
+        if self.ready:
+            await conn.prepare_registry()
+
+    def connection_stats(self):
+        # (server pid, hisoblagichlar) – ochiq ulanishlar bo‘yicha
+        return [(c.get_server_pid(), c.stats) for c in list(self.connections) if not c.is_closed()]
+
+    async def run(self, method, query, args):
+        self.stats["calls"] += 1
+        async with self.acquire() as conn:
+            if query in queries.NAMES:
+                if query in conn.prepared:
+                    conn.stats["reused"] += 1
+                else:
+                    # Sxema tayyor bo‘lishidan oldin ochilgan ulanish
+                    await conn.prepare_cached(query)
+            return await getattr(conn, method)(query, *args)
+
+    async def fetch(self, query, *args):
+        return await self.run("fetch", query, args)
+
+    async def fetchrow(self, query, *args):
+        return await self.run("fetchrow", query, args)
+
+    async def fetchval(self, query, *args):
+        return await self.run("fetchval", query, args)
+
+    async def execute(self, query, *args):
+        return await self.run("execute", query, args)
+
+
+db = Database()
+
+
+# ================================
+# FSM storage: xotirada (bitta jarayon) yoki PostgreSQL da (bir nechta
+# jarayon, restartdan keyin ham holat saqlanadi). Holatda faqat ID lar va
+# oddiy qiymatlar saqlanadi.
+class BoundedMemoryStorage(BaseStorage):
+    def __init__(self, maxsize=STATE_MAX_USERS, ttl=STATE_TTL):
+        self.records = ConversationStore(maxsize=maxsize, ttl=ttl)
+
+    def _save(self, key, state, data):
+        if state is None and not data:
+            self.records.pop(key, None)
+        else:
+            self.records[key] = (state, data)
+
+    async def set_state(self, key, state=None):
+        _, data = self.records.get(key, (None, {}))
+        self._save(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key):
+        return self.records.get(key, (None, {}))[0]
+
+    async def set_data(self, key, data):
+        state, _ = self.records.get(key, (None, {}))
+        self._save(key, state, dict(data))
+
+    async def get_data(self, key):
+        return dict(self.records.get(key, (None, {}))[1])
+
+    async def close(self):
+        self.records.clear()
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, database, ttl=STATE_TTL):
+        self.db = database
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+
+    async def set_state(self, key, state=None):
+        await self.db.execute(queries.FSM_SET_STATE, self.key_builder.build(key), state.state if isinstance(state, State) else state, self.ttl)
+
+    async def get_state(self, key):
+        return await self.db.fetchval(queries.FSM_GET_STATE, self.key_builder.build(key), self.ttl)
+
+    async def set_data(self, key, data):
+        await self.db.execute(queries.FSM_SET_DATA, self.key_builder.build(key), json.dumps(dict(data)), self.ttl)
+
+    async def get_data(self, key):
+        raw = await self.db.fetchval(queries.FSM_GET_DATA, self.key_builder.build(key), self.ttl)
+        return json.loads(raw) if raw else {}
+
+    async def purge(self, conn=None):
+        # Tugagan va muddati o‘tgan holatlarni tozalash
+        await (conn or self.db).execute(queries.FSM_PURGE, self.ttl)
+
+    async def close(self):
+        pass  # pool db.close() da yopiladi
+
+
+# ================================
+# Update lar tartibi: bitta foydalanuvchining update lari navbat bilan
+# (qulf ichida holat o‘qiladi), turli foydalanuvchilarniki parallel.
+# Qulf faqat kutayotgan update bor paytda saqlanadi.
+class UserEventIsolation(BaseEventIsolation):
+    def __init__(self):
+        self.locks = {}  # (bot_id, user_id) -> [Lock, kutayotganlar soni]
+
+    @asynccontextmanager
+    async def lock(self, key):
+        user_key = (key.bot_id, key.user_id)
+        entry = self.locks.get(user_key)
+        if entry is None:
+            entry = self.locks[user_key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[user_key]
+
+    async def close(self):
+        self.locks.clear()
+
+
+def make_fsm_storage():
+    if FSM_STORAGE == "postgres":
+        return PostgresStorage(db)
+    if FSM_STORAGE != "memory":
+        raise ValueError(f"FSM_STORAGE noto‘g‘ri: {FSM_STORAGE!r} (memory yoki postgres)")
+    return BoundedMemoryStorage()
+
+
+dp = Dispatcher(storage=make_fsm_storage(), events_isolation=UserEventIsolation())
+# Holatdagi xabarlar uchun handlerlar: holat -> handler (bitta qidiruv)
+state_handlers = StateDispatch()
 
 # ================================
 # Bekatlar ro‘yxati (50 ta)
@@ -65,63 +605,214 @@ STATION_LIST = [
     "Xonobod","Quruvchilar","Olmos","Paxtakor","Qipchoq","Amir Temur xiyoboni","Mustaqillik maydoni"
 ]
 
+# ================================
+# Bekatlar katalogi: id -> nom va nom -> id xotirada saqlanadi.
+# Bekatlar o‘zgarsa invalidate() chaqiriladi, keyingi so‘rovda qayta yuklanadi.
+class StationCatalog:
+    def __init__(self):
+        self.by_id = {}
+        self.by_name = {}
+        self.loaded = False
+        self.version = 0
+
+    async def load(self, conn=None):
+        rows = await (conn or db).fetch(queries.STATIONS_ALL)
+        self.by_id = {r["id"]: r["name"] for r in rows}
+        self.by_name = {r["name"]: r["id"] for r in rows}
+        self.loaded = True
+        self.version += 1
+
+    def invalidate(self):
+        self.loaded = False
+
+    async def name(self, station_id):
+        if not self.loaded or station_id not in self.by_id:
+            # Boshqa jarayon yangi bekat qo‘shgan bo‘lishi mumkin
+            await self.load()
+        return self.by_id.get(station_id)
+
+    async def id(self, name):
+        if not self.loaded or name not in self.by_name:
+            await self.load()
+        return self.by_name.get(name)
+
+    async def items(self):
+        if not self.loaded:
+            await self.load()
+        return list(self.by_id.items())
+
+
+station_catalog = StationCatalog()
+
+
+# ================================
+# Bekat tanlash klaviaturalari. Tugmalar joylashuvi katalogdan bir marta
+# quriladi; parametrsiz klaviatura to‘liq keshlanadi, parametrli
+# (masalan setstation:{head_id}) klaviaturada faqat callback_data yangilanadi.
+class StationKeyboards:
+    def __init__(self, catalog, width=2):
+        self.catalog = catalog
+        self.width = width
+        self.version = None
+        self.rows = []
+        self.markups = LRUCache(maxsize=256)
+
+    async def _refresh(self):
+        if self.version == self.catalog.version and self.catalog.loaded:
+            return
+        items = await self.catalog.items()
+        self.rows = [items[i:i + self.width] for i in range(0, len(items), self.width)]
+        self.markups.clear()
+        self.version = self.catalog.version
+
+    async def get(self, prefix, *params):
+        await self._refresh()
+        head = ":".join([prefix, *(str(p) for p in params)])
+        markup = self.markups.get(head)
+        if markup is None:
+            markup = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=name, callback_data=f"{head}:{st_id}") for st_id, name in row]
+                for row in self.rows
+            ])
+            self.markups[head] = markup
+        return markup
+
+
+station_keyboards = StationKeyboards(station_catalog)
+
 # ================================
 # Bazani yaratish va ulanish
-async def setup_db():
-    global db_conn
+async def create_database():
+    # Faqat baza hali yo‘q bo‘lganda "postgres" bazasiga ulanamiz
     conn = await asyncpg.connect(
         user=DB_USER, password=DB_PASSWORD,
         host=DB_HOST, port=DB_PORT, database="postgres"
     )
-    exists = await conn.fetchval("SELECT 1 FROM pg_database WHERE datname=$1;", DB_NAME)
-    if not exists:
-        await conn.execute(f'CREATE DATABASE {DB_NAME};')
-    await conn.close()
+    try:
+        exists = await conn.fetchval("SELECT 1 FROM pg_database WHERE datname=$1;", DB_NAME)
+        if not exists:
+            await conn.execute(f'CREATE DATABASE {DB_NAME};')
+    finally:
+        await conn.close()
 
-    db_conn = await asyncpg.connect(
-        user=DB_USER, password=DB_PASSWORD,
-        host=DB_HOST, port=DB_PORT, database=DB_NAME
+
+async def setup_db():
+    started = time.perf_counter()
+    try:
+        await db.connect()
+    except asyncpg.InvalidCatalogNameError:
+        logger.info("%s bazasi topilmadi, yaratilmoqda", DB_NAME)
+        await create_database()
+        await db.connect()
+    connected = time.perf_counter()
+
+    async with db.acquire() as conn:
+        await setup_schema(conn)
+        # Sxema tayyor: bundan keyin ochiladigan ulanishlar init da tayyorlaydi,
+        # undan oldin ochilganlari esa har bir so‘rovni birinchi chaqiruvda
+        db.ready = True
+        await conn.prepare_registry()
+        migrated = time.perf_counter()
+        # Seed qilingandan keyin katalogni to‘liq yuklaymiz
+        await station_catalog.load(conn)
+        await load_head_stations(conn)
+        if isinstance(dp.storage, PostgresStorage):
+            await dp.storage.purge(conn)
+    loaded = time.perf_counter()
+
+    logger.info(
+        "Baza tayyor: %.0f ms (ulanish %.0f, sxema %.0f, kesh %.0f)",
+        (loaded - started) * 1000, (connected - started) * 1000,
+        (migrated - connected) * 1000, (loaded - migrated) * 1000,
     )
 
-    # Jadval yaratish
-    await db_conn.execute("""
-        CREATE TABLE IF NOT EXISTS stations (
-            id SERIAL PRIMARY KEY,
-            name TEXT UNIQUE
-        );
-    """)
-    await db_conn.execute("""
-        CREATE TABLE IF NOT EXISTS workers (
-            id SERIAL PRIMARY KEY,
-            full_name TEXT NOT NULL,
-            tabel VARCHAR(10) NOT NULL,
-            position TEXT NOT NULL,
-            smena TEXT NOT NULL,
-            station_id INT REFERENCES stations(id) ON DELETE CASCADE,
-            photo TEXT
-        );
-    """)
-    await db_conn.execute("""
-        CREATE TABLE IF NOT EXISTS station_heads (
-            id SERIAL PRIMARY KEY,
-            head_telegram_id BIGINT UNIQUE,
-            station_id INT REFERENCES stations(id) ON DELETE CASCADE
-        );
-    """)
-
-    # 50 ta bekatni qo‘shib qo‘yish
-    for st in STATION_LIST:
-        await db_conn.execute(
-            "INSERT INTO stations(name) VALUES($1) ON CONFLICT (name) DO NOTHING;",
-            st
-        )
+
+async def setup_schema(conn):
+    # Jadvallar va indekslar migrations/ papkasida, faqat yangilari qo‘llanadi
+    applied = await migrate(conn)
+    if applied:
+        logger.info("Qo‘llangan migratsiyalar: %s", ", ".join(f"{v:04d}" for v in applied))
+
+    # 50 ta bekatni bitta so‘rov bilan qo‘shib qo‘yish. NOT EXISTS – mavjud
+    # bekatlar uchun SERIAL ketma-ketligi har startda behuda oshmasin.
+    await conn.execute("""
+        INSERT INTO stations(name)
+        SELECT s.name FROM unnest($1::text[]) WITH ORDINALITY AS s(name, ord)
+        WHERE NOT EXISTS (SELECT 1 FROM stations WHERE stations.name = s.name)
+        ORDER BY s.ord
+        ON CONFLICT (name) DO NOTHING;
+    """, STATION_LIST)
 
 # ================================
+# Boshliq -> bekat keshi (TTL + LRU). Boshliq bo‘lmaganlar ham (None) keshlanadi.
+# set_station, edit_head_setstation va delete_head_id keshni tozalaydi.
+head_station_cache = TTLCache(maxsize=HEAD_CACHE_SIZE, ttl=HEAD_CACHE_TTL)
+_MISSING = object()
+
+
+async def load_head_stations(conn=None):
+    rows = await (conn or db).fetch(queries.HEADS_ALL)
+    for r in rows:
+        head_station_cache[r["head_telegram_id"]] = r["station_id"]
+
+
+def forget_head(user_id):
+    head_station_cache.pop(user_id, None)
+
+
 async def get_head_station(user_id):
-    row = await db_conn.fetchrow(
-        "SELECT station_id FROM station_heads WHERE head_telegram_id=$1", user_id
-    )
-    return row["station_id"] if row else None
+    station_id = head_station_cache.get(user_id, _MISSING)
+    if station_id is not _MISSING:
+        return station_id
+
+    row = await db.fetchrow(queries.HEAD_STATION, user_id)
+    station_id = row["station_id"] if row else None
+    head_station_cache[user_id] = station_id
+    return station_id
+
+# ========== STATE ==========
+class WorkerSelect(StatesGroup):
+    waiting_for_number = State()
+
+
+class AddHead(StatesGroup):
+    telegram_id = State()
+    station = State()
+
+
+class EditHead(StatesGroup):
+    station = State()
+
+
+class AddWorker(StatesGroup):
+    full_name = State()
+    tabel = State()
+    position = State()
+    smena = State()
+    photo = State()
+
+
+class EditWorker(StatesGroup):
+    choose = State()
+    field = State()
+    full_name = State()
+    tabel = State()
+    photo = State()
+    more = State()
+
+
+class DeleteWorker(StatesGroup):
+    choose = State()
+    confirm = State()
+
+
+class FindWorker(StatesGroup):
+    query = State()
+
+
+class ImportWorkers(StatesGroup):
+    file = State()
+
 
 # ================================
 # HELP komandasi
@@ -133,7 +824,10 @@ async def cmd_help(message: types.Message):
             "/add_head – yangi bekat boshlig‘i qo‘shish\n"
             "/edit_head – mavjud boshliqni tahrirlash\n"
             "/delete_head – boshliqni o‘chirish\n"
-            "/all_workers – bekat bo‘yicha xodimlar ro‘yxati\n\n"
+            "/all_workers – bekat bo‘yicha xodimlar ro‘yxati\n"
+            "/find – xodimni F.I.O yoki tabel bo‘yicha qidirish\n"
+            "/export – xodimlar ro‘yxati fayli (csv/xlsx; bekat=; lavozim=; smena=)\n"
+            "/stats – bot holati (navbatlar)\n\n"
             "ℹ️ Bekat boshlig‘i komandalar:\n"
             "/start – botni boshlash\n"
         )
@@ -141,70 +835,91 @@ async def cmd_help(message: types.Message):
         text = (
             "ℹ️ Bekat boshlig‘i komandalar:\n"
             "/start – botni boshlash\n"
+            "/import – xodimlarni CSV/XLSX fayldan yuklash\n"
         )
     await message.answer(text)
 
 
+# ================================
+# STATS komandasi (superadmin)
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    if message.from_user.id not in SUPERADMINS:
+        return await message.answer("❌ Sizda ruxsat yo‘q.")
+
+    st = notifier.stats
+    # Ochiq ulanishlar bo‘yicha: prepare soni/vaqti va qayta ishlatilgan rejalar
+    conns = db.connection_stats()
+    prepares = sum(c["prepares"] for _, c in conns)
+    prepare_ms = sum(c["prepare_ms"] for _, c in conns)
+    reused = sum(c["reused"] for _, c in conns)
+    per_conn = "".join(
+        f"\n🔌 #{pid}: prepare {c['prepares']} ({c['prepare_ms']:.0f} ms), qayta {c['reused']}"
+        for pid, c in conns
+    )
+    await message.answer(
+        "📊 Guruh xabarlari:\n"
+        f"📥 Navbatda: {notifier.queue.qsize()}\n"
+        f"✅ Yuborildi: {st['sent']}\n"
+        f"❌ Xato: {st['failed']}\n"
+        f"🗑 Tashlandi: {st['dropped']}\n\n"
+        "🗄 SQL so‘rovlar:\n"
+        f"▶️ Bajarildi: {db.stats['calls']}\n"
+        f"🧩 Tayyorlandi (prepare): {prepares} ({prepare_ms:.0f} ms)\n"
+        f"♻️ Reja qayta ishlatildi: {reused}"
+        f"{per_conn}"
+    )
+
+
 # ================================
 # ADMIN PANEL: boshliq qo‘shish
 @dp.message(Command("add_head"))
-async def add_head(message: types.Message):
+async def add_head(message: types.Message, state: FSMContext):
     if message.from_user.id not in SUPERADMINS:
         return await message.answer("❌ Sizda ruxsat yo‘q.")
 
     await message.answer("👤 Yangi boshliqning Telegram ID sini yuboring:")
-    user_states[message.from_user.id] = {"state": "ask_new_head_id"}
+    await state.set_state(AddHead.telegram_id)
 
 
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "ask_new_head_id")
-async def ask_station(message: types.Message):
+@state_handlers(AddHead.telegram_id)
+async def ask_station(message: types.Message, state: FSMContext):
     text_id = message.text.strip()
     if not text_id.isdigit() or len(text_id) < 9 or len(text_id) > 10:
         return await message.answer("❌ Telegram ID noto‘g‘ri. 9–10 raqam bo‘lishi kerak.")
 
     new_id = int(text_id)
-    user_states[message.from_user.id]["new_head_id"] = new_id
-    user_states[message.from_user.id]["state"] = "choose_station"
-
-    stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-    kb = InlineKeyboardBuilder()
-    for st in stations:
-        kb.button(text=st["name"], callback_data=f"setstation:{new_id}:{st['id']}")
-    kb.adjust(2)
+    await state.update_data(new_head_id=new_id)
+    await state.set_state(AddHead.station)
 
-    await message.answer("🏢 Bekatni tanlang:", reply_markup=kb.as_markup())
+    kb = await station_keyboards.get("setstation", new_id)
+    await message.answer("🏢 Bekatni tanlang:", reply_markup=kb)
 
 
 @dp.callback_query(F.data.startswith("setstation:"))
-async def set_station(callback: types.CallbackQuery):
+async def set_station(callback: types.CallbackQuery, state: FSMContext):
     _, new_id, station_id = callback.data.split(":")
     new_id, station_id = int(new_id), int(station_id)
 
-    await db_conn.execute("""
-        INSERT INTO station_heads(head_telegram_id, station_id)
-        VALUES($1, $2)
-        ON CONFLICT(head_telegram_id) DO UPDATE SET station_id=$2
-    """, new_id, station_id)
+    await db.execute(queries.HEAD_UPSERT, new_id, station_id)
+    forget_head(new_id)
 
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    station_name = await station_catalog.name(station_id)
     await callback.message.edit_text(f"✅ {new_id} boshliq qilib qo‘shildi.\n🏢 Bekat: {station_name}")
-    await send_to_group(f"👑 Yangi boshliq qo‘shildi!\n\n🆔 {new_id}\n🏢 Bekat: {station_name}")
-    user_states.pop(callback.from_user.id, None)
+    send_to_group(f"👑 Yangi boshliq qo‘shildi!\n\n🆔 {new_id}\n🏢 Bekat: {station_name}", station_id)
+    await state.clear()
 
 
 
 @dp.callback_query(F.data.startswith("setstation:"))
-async def set_station(callback: types.CallbackQuery):
+async def set_station(callback: types.CallbackQuery, state: FSMContext):
     _, new_id, station_id = callback.data.split(":")
     new_id, station_id = int(new_id), int(station_id)
 
-    await db_conn.execute("""
-        INSERT INTO station_heads(head_telegram_id, station_id)
-        VALUES($1, $2)
-        ON CONFLICT(head_telegram_id) DO UPDATE SET station_id=$2
-    """, new_id, station_id)
+    await db.execute(queries.HEAD_UPSERT, new_id, station_id)
+    forget_head(new_id)
 
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    station_name = await station_catalog.name(station_id)
 
     # Admin uchun xabar
     await callback.message.edit_text(
@@ -212,8 +927,9 @@ async def set_station(callback: types.CallbackQuery):
     )
 
     # Guruhga xabar
-    await send_to_group(
-        f"👑 Yangi boshliq qo‘shildi!✅\n\n🆔 {new_id}\n🏢 Bekat: {station_name}"
+    send_to_group(
+        f"👑 Yangi boshliq qo‘shildi!✅\n\n🆔 {new_id}\n🏢 Bekat: {station_name}",
+        station_id,
     )
 
     # Yangi boshliqning o‘ziga xabar
@@ -226,7 +942,7 @@ async def set_station(callback: types.CallbackQuery):
         # Agar foydalanuvchi botni start qilmagan bo‘lsa xato chiqadi
         print(f"Xabar yuborilmadi: {e}")
 
-    user_states.pop(callback.from_user.id, None)
+    await state.clear()
 
 
 
@@ -237,18 +953,14 @@ async def edit_head(message: types.Message):
     if message.from_user.id not in SUPERADMINS:
         return await message.answer("❌ Sizda ruxsat yo‘q.")
     
-    stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-    kb = InlineKeyboardBuilder()
-    for st in stations:
-        kb.button(text=st["name"], callback_data=f"edith_head_station:{st['id']}")
-    kb.adjust(2)
-    await message.answer("✏️ Qaysi bekat boshliqini tahrirlashni xohlaysiz?", reply_markup=kb.as_markup())
+    kb = await station_keyboards.get("edith_head_station")
+    await message.answer("✏️ Qaysi bekat boshliqini tahrirlashni xohlaysiz?", reply_markup=kb)
 
 
 @dp.callback_query(F.data.startswith("edith_head_station:"))
 async def edith_head_station(callback: types.CallbackQuery):
     _, station_id = callback.data.split(":")
-    heads = await db_conn.fetch("SELECT head_telegram_id FROM station_heads WHERE station_id=$1", int(station_id))
+    heads = await db.fetch(queries.HEADS_BY_STATION, int(station_id))
     if not heads:
         return await callback.message.edit_text("❌ Ushbu bekatda boshliq yo‘q.")
     
@@ -260,30 +972,29 @@ async def edith_head_station(callback: types.CallbackQuery):
 
 
 @dp.callback_query(F.data.startswith("edit_head_id:"))
-async def edit_head_id(callback: types.CallbackQuery):
+async def edit_head_id(callback: types.CallbackQuery, state: FSMContext):
     _, head_id = callback.data.split(":")
-    user_states[callback.from_user.id] = {"state": "edit_head_choose_station", "edit_head_id": int(head_id)}
-    stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-    kb = InlineKeyboardBuilder()
-    for st in stations:
-        kb.button(text=st["name"], callback_data=f"edit_head_setstation:{head_id}:{st['id']}")
-    kb.adjust(2)
-    await callback.message.edit_text("🏢 Yangi bekatni tanlang:", reply_markup=kb.as_markup())
+    await state.set_state(EditHead.station)
+    await state.set_data({"edit_head_id": int(head_id)})
+    kb = await station_keyboards.get("edit_head_setstation", head_id)
+    await callback.message.edit_text("🏢 Yangi bekatni tanlang:", reply_markup=kb)
 
 
 @dp.callback_query(F.data.startswith("edit_head_setstation:"))
-async def edit_head_setstation(callback: types.CallbackQuery):
+async def edit_head_setstation(callback: types.CallbackQuery, state: FSMContext):
     _, head_id, new_station_id = callback.data.split(":")
     head_id, new_station_id = int(head_id), int(new_station_id)
+    await state.clear()
 
-    await db_conn.execute("UPDATE station_heads SET station_id=$1 WHERE head_telegram_id=$2", new_station_id, head_id)
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", new_station_id)
+    await db.execute(queries.HEAD_MOVE, new_station_id, head_id)
+    forget_head(head_id)
+    station_name = await station_catalog.name(new_station_id)
 
     # Admin uchun xabar
     await callback.message.edit_text(f"✅ {head_id} boshliq yangilandi.\n🏢 Yangi bekat: {station_name}")
 
     # Guruhga xabar
-    await send_to_group(f"✏️ Boshliq yangilandi!\n\n🆔 {head_id}\n🏢 Yangi bekat: {station_name}")
+    send_to_group(f"✏️ Boshliq yangilandi!\n\n🆔 {head_id}\n🏢 Yangi bekat: {station_name}", new_station_id)
 
     # Boshliqning o‘ziga xabar
     try:
@@ -297,21 +1008,62 @@ async def edit_head_setstation(callback: types.CallbackQuery):
 
 # ================================
 # DELETE HEAD
+# Inline klaviatura 100 tugmadan oshmasligi kerak, shuning uchun boshliqlar
+# head_telegram_id kursori bilan sahifalanadi: har sahifa bitta JOIN so‘rov.
+HEADS_PAGE_SIZE = 40
+
+
+async def fetch_heads_page(direction, head_id, limit=HEADS_PAGE_SIZE):
+    if direction == "next":
+        rows = await db.fetch(queries.HEADS_PAGE_NEXT, head_id, limit + 1)
+        has_more = len(rows) > limit
+        return rows[:limit], head_id != 0, has_more
+
+    rows = await db.fetch(queries.HEADS_PAGE_PREV, head_id, limit + 1)
+    has_more = len(rows) > limit
+    return list(reversed(rows[:limit])), has_more, True
+
+
+def heads_page_markup(rows, has_prev, has_next):
+    kb = InlineKeyboardBuilder()
+    for h in rows:
+        kb.button(text=f"{h['head_telegram_id']} ({h['station_name'] or '—'})", callback_data=f"delete_head_id:{h['head_telegram_id']}")
+    kb.adjust(2)
+
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"dhp:prev:{rows[0]['head_telegram_id']}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"dhp:next:{rows[-1]['head_telegram_id']}"))
+    if nav:
+        kb.row(*nav)
+    return kb.as_markup()
+
+
 @dp.message(Command("delete_head"))
 async def delete_head(message: types.Message):
     if message.from_user.id not in SUPERADMINS:
         return await message.answer("❌ Sizda ruxsat yo‘q.")
-    
-    heads = await db_conn.fetch("SELECT head_telegram_id, station_id FROM station_heads")
+
+    heads, has_prev, has_next = await fetch_heads_page("next", 0)
     if not heads:
         return await message.answer("❌ Hozircha hech qanday boshliq yo‘q.")
-    
-    kb = InlineKeyboardBuilder()
-    for h in heads:
-        station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", h["station_id"])
-        kb.button(text=f"{h['head_telegram_id']} ({station_name})", callback_data=f"delete_head_id:{h['head_telegram_id']}")
-    kb.adjust(2)
-    await message.answer("🗑 O‘chirish uchun boshliqni tanlang:", reply_markup=kb.as_markup())
+
+    await message.answer("🗑 O‘chirish uchun boshliqni tanlang:", reply_markup=heads_page_markup(heads, has_prev, has_next))
+
+
+@dp.callback_query(F.data.startswith("dhp:"))
+async def delete_head_page(callback: types.CallbackQuery):
+    if callback.from_user.id not in SUPERADMINS:
+        return await callback.answer("❌ Siz superadmin emassiz.", show_alert=True)
+
+    _, direction, head_id = callback.data.split(":")
+    heads, has_prev, has_next = await fetch_heads_page(direction, int(head_id))
+    if not heads:
+        return await callback.answer("❌ Boshliqlar topilmadi.", show_alert=True)
+
+    await callback.message.edit_reply_markup(reply_markup=heads_page_markup(heads, has_prev, has_next))
+    await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("delete_head_id:"))
@@ -319,16 +1071,20 @@ async def delete_head_id(callback: types.CallbackQuery):
     _, head_id = callback.data.split(":")
     head_id = int(head_id)
 
-    # O‘chirishdan oldin bekatni olish
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE head_telegram_id=$1", head_id)
+    # Bitta so‘rov: o‘chirish va bekatni qaytarish, nomi katalogdan
+    row = await db.fetchrow(queries.HEAD_DELETE, head_id)
+    forget_head(head_id)
+    if row is None:
+        return await callback.answer("❌ Bu boshliq allaqachon o‘chirilgan.", show_alert=True)
 
-    await db_conn.execute("DELETE FROM station_heads WHERE head_telegram_id=$1", head_id)
+    station_id = row["station_id"]
+    station_name = await station_catalog.name(station_id)
 
     # Admin uchun xabar
     await callback.message.edit_text(f"✅ {head_id} boshliq o‘chirildi.\n🏢 Bekat: {station_name}")
 
     # Guruhga xabar
-    await send_to_group(f"🗑 Boshliq o‘chirildi!\n\n🆔 {head_id}\n🏢 Bekat: {station_name}")
+    send_to_group(f"🗑 Boshliq o‘chirildi!\n\n🆔 {head_id}\n🏢 Bekat: {station_name}", station_id)
 
     # Boshliqning o‘ziga xabar
     try:
@@ -344,11 +1100,6 @@ async def delete_head_id(callback: types.CallbackQuery):
 
 
 
-# ========== STATE ==========
-class WorkerSelect(StatesGroup):
-    waiting_for_number = State()
-
-
 # ================================
 # ALL WORKERS
 @dp.message(Command("all_workers"))
@@ -356,12 +1107,12 @@ async def all_workers(message: types.Message, state: FSMContext):
     if message.from_user.id not in SUPERADMINS:
         return await message.answer("❌ Sizda ruxsat yo‘q.")
 
-    stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-    kb = InlineKeyboardBuilder()
-    for st in stations:
-        kb.button(text=st["name"], callback_data=f"all_workers_station:{st['id']}")
-    kb.adjust(2)
-    await message.answer("🏢 Qaysi bekat xodimlarini ko‘rmoqchisiz?", reply_markup=kb.as_markup())
+    kb = await station_keyboards.get("all_workers_station")
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📋 Barcha xodimlar", callback_data="awp:next:0:0")],
+        *kb.inline_keyboard,
+    ])
+    await message.answer("🏢 Qaysi bekat xodimlarini ko‘rmoqchisiz?", reply_markup=kb)
 
 
 # ================================
@@ -372,13 +1123,10 @@ async def all_workers_station(callback: types.CallbackQuery, state: FSMContext):
     station_id = int(station_id)
 
     # Bekat nomini olish
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    station_name = await station_catalog.name(station_id)
 
     # Xodimlarni olish
-    workers = await db_conn.fetch(
-        "SELECT id, full_name, tabel, position, smena FROM workers WHERE station_id=$1 ORDER BY id", 
-        station_id
-    )
+    workers = await db.fetch(queries.WORKERS_ROSTER, station_id)
 
     if not workers:
         return await callback.message.edit_text(f"❌ {station_name} bekatida xodim yo‘q.")
@@ -394,33 +1142,27 @@ async def all_workers_station(callback: types.CallbackQuery, state: FSMContext):
 
     # STATEga saqlash
     await state.set_state(WorkerSelect.waiting_for_number)
-    await state.update_data(workers=[dict(w) for w in workers])
+    await state.update_data(worker_ids=[w["id"] for w in workers])
 
 
 # ================================
 # WORKER DETAIL (raqam yozilganda)
-@dp.message(WorkerSelect.waiting_for_number)
+@state_handlers(WorkerSelect.waiting_for_number)
 async def worker_detail(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    workers = data.get("workers", [])
+    worker_ids = data.get("worker_ids", [])
 
     if not message.text.isdigit():
         return await message.answer("❌ Iltimos, faqat raqam yozing (masalan: 1).")
 
     idx = int(message.text)
-    if idx < 1 or idx > len(workers):
+    if idx < 1 or idx > len(worker_ids):
         return await message.answer("❌ Noto‘g‘ri raqam, ro‘yxatdan tanlang.")
 
-    worker = workers[idx - 1]
+    worker_id = worker_ids[idx - 1]
 
     # Batafsil ma'lumot olish
-    w = await db_conn.fetchrow(
-        "SELECT w.full_name, w.tabel, w.position, w.smena, w.photo, s.name AS station_name "
-        "FROM workers w "
-        "JOIN stations s ON w.station_id = s.id "
-        "WHERE w.id=$1", 
-        worker["id"]
-    )
+    w = await db.fetchrow(queries.WORKER_DETAIL, worker_id)
 
     caption = (
         f"👤 {w['full_name']}\n"
@@ -431,7 +1173,8 @@ async def worker_detail(message: types.Message, state: FSMContext):
     )
 
     if w['photo']:
-        await message.answer_photo(photo=w['photo'], caption=caption)
+        sent = await message.answer_photo(photo=worker_photo(w), caption=caption)
+        await remember_photo_file_ids([(w, sent)])
     else:
         await message.answer(caption)
 
@@ -453,15 +1196,16 @@ async def start(message: types.Message):
     if not station_id:
         return await message.answer("❌ Siz bekat boshlig‘i sifatida ro‘yxatdan o‘tmagansiz.")
 
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    station_name = await station_catalog.name(station_id)
     await message.answer(
         f"👋 Assalomu alaykum, {message.from_user.full_name}!\n"
         f"✅ Siz {station_name} bekati boshlig‘i sifatida ro‘yxatdan o‘tgansiz.",
         reply_markup=main_kb
     )
-    await send_to_group(
+    send_to_group(
         f"ℹ️ {message.from_user.full_name} (ID: {message.from_user.id}) "
-        f"`/start` bosdi.\n🏢 Bekat: {station_name}"
+        f"`/start` bosdi.\n🏢 Bekat: {station_name}",
+        station_id,
     )
 
 # ================================
@@ -472,109 +1216,125 @@ async def my_workers(message: types.Message):
     if not station_id:
         return await message.answer("❌ Siz boshliq emassiz.")
 
-    workers = await db_conn.fetch("SELECT * FROM workers WHERE station_id=$1 ORDER BY id", station_id)
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    workers = await db.fetch(queries.WORKERS_BY_STATION, station_id)
+    station_name = await station_catalog.name(station_id)
 
     if not workers:
         return await message.answer("❌ Sizda hozircha xodimlar yo‘q.")
 
-    await message.answer(f"🏢 Bekat: {station_name}\n📝 Xodimlar ro‘yxati:")
-
-    for idx, w in enumerate(workers, start=1):
-        caption = (f"{idx}. 👤 {w['full_name']}\n"
-                   f"   🔢 Tabel: {w['tabel']}\n"
-                   f"   💼 Lavozim: {w['position']}\n"
-                   f"   🕒 Smena: {w['smena']}")
-        
-        if w['photo']:
-            await message.answer_photo(photo=w['photo'], caption=caption)
-        else:
-            await message.answer(caption)
+    await message.answer(f"🏢 Bekat: {station_name}\n📝 Xodimlar ro‘yxati ({len(workers)} ta):")
 
+    # Rasmli xodimlar albom (10 tadan), rasmsizlar bitta matnli ro‘yxat
+    numbered = list(enumerate(workers, start=1))
+    await send_worker_album(message, [(idx, w) for idx, w in numbered if w['photo']])
 
-# ================================
-# Superadmin – barcha bekatlar va xodimlar
-@dp.message(Command("all_workers"))
-async def all_workers(message: types.Message):
-    if message.from_user.id not in SUPERADMINS:
-        return await message.answer("❌ Siz superadmin emassiz.")
+    roster_lines = [worker_caption(idx, w) for idx, w in numbered if not w['photo']]
+    for chunk in split_text(roster_lines, sep="\n\n"):
+        await message.answer(chunk)
 
-    stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-    if not stations:
-        return await message.answer("❌ Hozircha hech qanday bekat yo‘q.")
-
-    await message.answer("📋 Barcha bekatlar va xodimlar:")
-
-    for st in stations:
-        workers = await db_conn.fetch("SELECT * FROM workers WHERE station_id=$1 ORDER BY id", st["id"])
-        if not workers:
-            continue
-
-        text = [f"🏢 {st['name']}:"]
-        for idx, w in enumerate(workers, start=1):
-            caption = (f"{idx}. 👤 {w['full_name']}\n"
-                       f"   🔢 Tabel: {w['tabel']}\n"
-                       f"   💼 Lavozim: {w['position']}\n"
-                       f"   🕒 Smena: {w['smena']}")
-            
-            if w['photo']:
-                await message.answer_photo(photo=w['photo'], caption=caption)
-            else:
-                text.append(caption)
-
-        # Agar ba'zi xodimlarda rasm bo‘lmasa, matnni jo‘natamiz
-        if len(text) > 1:
-            await message.answer("\n".join(text))
 
+# ================================
+# Superadmin – barcha bekatlar va xodimlar (sahifalab)
+# Kursor – sahifadagi birinchi/oxirgi (station_id, id) juftligi, shuning uchun
+# har bir sahifa bitta indeksli so‘rov va bitta edit_text bilan chiqadi.
+ALL_WORKERS_PAGE_SIZE = 20
+
+
+async def fetch_workers_page(direction, station_id, worker_id, limit=ALL_WORKERS_PAGE_SIZE):
+    if direction == "next":
+        rows = await db.fetch(queries.WORKERS_PAGE_NEXT, station_id, worker_id, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, (station_id, worker_id) != (0, 0), has_more
+
+    rows = await db.fetch(queries.WORKERS_PAGE_PREV, station_id, worker_id, limit + 1)
+    has_more = len(rows) > limit
+    rows = list(reversed(rows[:limit]))
+    return rows, has_more, True
+
+
+def render_workers_page(rows, has_prev, has_next):
+    lines = ["📋 Barcha bekatlar va xodimlar:"]
+    current_station = None
+    for w in rows:
+        if w["station_id"] != current_station:
+            current_station = w["station_id"]
+            lines.append(f"\n🏢 {w['station_name']}:")
+        lines.append(f"• {w['full_name']} — {w['tabel']} — {w['position']} — {w['smena']}")
+
+    nav = []
+    if has_prev:
+        first = rows[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Oldingi", callback_data=f"awp:prev:{first['station_id']}:{first['id']}"))
+    if has_next:
+        last = rows[-1]
+        nav.append(InlineKeyboardButton(
+            text="Keyingi ➡️", callback_data=f"awp:next:{last['station_id']}:{last['id']}"))
+    markup = InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+    return "\n".join(lines), markup
+
+
+@dp.callback_query(F.data.startswith("awp:"))
+async def all_workers_page(callback: types.CallbackQuery):
+    if callback.from_user.id not in SUPERADMINS:
+        return await callback.answer("❌ Siz superadmin emassiz.", show_alert=True)
+
+    _, direction, station_id, worker_id = callback.data.split(":")
+    rows, has_prev, has_next = await fetch_workers_page(direction, int(station_id), int(worker_id))
+    if not rows:
+        return await callback.answer("❌ Xodimlar topilmadi.", show_alert=True)
+
+    text, markup = render_workers_page(rows, has_prev, has_next)
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
 
 
 # ================================
 # Worker qo‘shish (telefon olinmaydi, rasm tekshiriladi)
 @dp.message(F.text == "➕ Xodim qo'shish")
-async def add_worker(message: types.Message):
-    user_states[message.from_user.id] = {'state': "ASK_FULLNAME", 'mode': 'new'}
+async def add_worker(message: types.Message, state: FSMContext):
+    await state.set_state(AddWorker.full_name)
+    await state.set_data({})
     await message.answer("👤 Yangi xodimning F.I.O sini kiriting:")
 
 
 # F.I.O dan keyin tabel raqami
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "ASK_FULLNAME")
-async def ask_tabel(message: types.Message):
-    user_states[message.from_user.id]["full_name"] = message.text
-    user_states[message.from_user.id]["state"] = "ASK_TABEL"
+@state_handlers(AddWorker.full_name)
+async def ask_tabel(message: types.Message, state: FSMContext):
+    await state.update_data(full_name=message.text)
+    await state.set_state(AddWorker.tabel)
     await message.answer("🔢 Tabel raqamini kiriting (masalan: 01000):")
 
 
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "ASK_TABEL")
-async def ask_position(message: types.Message):
+@state_handlers(AddWorker.tabel)
+async def ask_position(message: types.Message, state: FSMContext):
     tabel = message.text.strip()
-    if not (tabel.isdigit() and len(tabel) == 5):
+    if not roster.valid_tabel(tabel):
         return await message.answer("❌ Tabel raqam faqat 5 xonali raqam bo‘lishi kerak. Qayta kiriting:")
+    if await db.fetchval(queries.WORKER_TABEL_TAKEN, tabel):
+        return await message.answer("❌ Bu tabel raqamli xodim allaqachon mavjud. Boshqa tabel kiriting:")
 
-    user_states[message.from_user.id]["tabel"] = tabel
-    user_states[message.from_user.id]["state"] = "ASK_POSITION"
+    await state.update_data(tabel=tabel)
+    await state.set_state(AddWorker.position)
 
     # Lavozim variantlari
-    positions = ["ДСЦП", "ДСП", "ДСПО", "ДСПЕ", "ОПЕРАТОР", "КАТТА ОПЕРАТОР", "УПП", "БЕКАТ БОШЛИҒИ"]
     kb = InlineKeyboardBuilder()
-    for pos in positions:
+    for pos in roster.POSITIONS:
         kb.button(text=pos, callback_data=f"choose_position:{pos}")
     kb.adjust(2)
     await message.answer("💼 Lavozimni tanlang:", reply_markup=kb.as_markup())
 
 # Inline tanlash - lavozim
-@dp.callback_query(F.data.startswith("choose_position:"))
-async def choose_position(callback: types.CallbackQuery):
+@dp.callback_query(AddWorker.position, F.data.startswith("choose_position:"))
+async def choose_position(callback: types.CallbackQuery, state: FSMContext):
     position = callback.data.split(":")[1]
-    user_states[callback.from_user.id]["position"] = position
-    user_states[callback.from_user.id]["state"] = "ASK_SMENA"
+    await state.update_data(position=position)
+    await state.set_state(AddWorker.smena)
 
     # smena variantlari
-    smena_variants = [
-        "Кундузги", "Кечги", "ТМТ",
-        "17 режим", "17 режим кундузги 7-19", "15 - режим 8-20"
-    ]
     kb = InlineKeyboardBuilder()
-    for sm in smena_variants:
+    for sm in roster.SMENAS:
         kb.button(text=sm, callback_data=f"choose_smena:{sm}")
     kb.adjust(2)
 
@@ -585,12 +1345,12 @@ async def choose_position(callback: types.CallbackQuery):
 
 
 # Inline tanlash - smena
-@dp.callback_query(F.data.startswith("choose_smena:"))
-async def choose_smena(callback: types.CallbackQuery):
+@dp.callback_query(AddWorker.smena, F.data.startswith("choose_smena:"))
+async def choose_smena(callback: types.CallbackQuery, state: FSMContext):
     smena = callback.data.split(":", 1)[1]
 
-    user_states[callback.from_user.id]["smena"] = smena
-    user_states[callback.from_user.id]["state"] = "ASK_PHOTO"
+    await state.update_data(smena=smena)
+    await state.set_state(AddWorker.photo)
 
     await callback.message.edit_text(
         f"✅ Smena: {smena}\n\n🖼️ Endi xodimning rasm linkini yuboring yoki rasmini yuboring (jpg, png, webp):"
@@ -599,8 +1359,8 @@ async def choose_smena(callback: types.CallbackQuery):
 
 
 # Rasm qabul qilish va saqlash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "ASK_PHOTO")
-async def save_worker(message: types.Message):
+@state_handlers(AddWorker.photo)
+async def save_worker(message: types.Message, state: FSMContext):
     if message.photo:
         photo = message.photo[-1].file_id
     elif message.text and (message.text.startswith("http://") or message.text.startswith("https://")):
@@ -608,86 +1368,405 @@ async def save_worker(message: types.Message):
     else:
         return await message.answer("❌ Faqat rasm yuborilishi yoki rasm linki bo‘lishi kerak. Qayta yuboring:")
 
-    user_states[message.from_user.id]["photo"] = photo
+    data = await state.get_data()
 
     station_id = await get_head_station(message.from_user.id)
     if not station_id:
         return await message.answer("❌ Siz boshliq emassiz.")
 
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", station_id)
+    station_name = await station_catalog.name(station_id)
 
-    await db_conn.execute("""
-        INSERT INTO workers(full_name, tabel, position, smena, station_id, photo)
-        VALUES($1,$2,$3,$4,$5,$6)
-    """,
-        user_states[message.from_user.id]["full_name"],
-        user_states[message.from_user.id]["tabel"],
-        user_states[message.from_user.id]["position"],
-        user_states[message.from_user.id]["smena"],
-        station_id,
-        photo
-    )
+    try:
+        await db.execute(
+            queries.WORKER_INSERT,
+            data["full_name"],
+            data["tabel"],
+            data["position"],
+            data["smena"],
+            station_id,
+            photo
+        )
+    except asyncpg.UniqueViolationError:
+        # Tabel tekshiruvidan keyin boshqa boshliq shu tabelni qo‘shib ulgurgan
+        await state.set_state(AddWorker.tabel)
+        return await message.answer(
+            f"❌ {data['tabel']} tabel raqamli xodim allaqachon mavjud. Boshqa tabel kiriting:"
+        )
 
     text = (
         f"✅ Xodim qo‘shildi!\n"
         f"🏢 Bekat: {station_name}\n"
-        f"👤 {user_states[message.from_user.id]['full_name']}\n"
-        f"🔢 Tabel: {user_states[message.from_user.id]['tabel']}\n"
-        f"💼 Lavozim: {user_states[message.from_user.id]['position']}\n"
-        f"🕒 Smena: {user_states[message.from_user.id]['smena']}"
+        f"👤 {data['full_name']}\n"
+        f"🔢 Tabel: {data['tabel']}\n"
+        f"💼 Lavozim: {data['position']}\n"
+        f"🕒 Smena: {data['smena']}"
     )
     await message.answer(text, reply_markup=main_kb)
-    await send_to_group(f"➕ Yangi xodim qo‘shildi!\n\n{text}")
+    send_to_group(f"➕ Yangi xodim qo‘shildi!\n\n{text}", station_id)
+
+    await state.clear()
+
+
+# ================================
+# Xodimlarni fayldan import qilish (CSV / XLSX)
+# Fayl alohida oqimda o‘qiladi va tekshiriladi, xatosiz bo‘lsa barcha qatorlar
+# bitta tranzaksiyada COPY bilan yoziladi. Xato bo‘lsa hech narsa yozilmaydi.
+IMPORT_ERRORS_SHOWN = 30
+WORKER_COPY_COLUMNS = ["full_name", "tabel", "position", "smena", "station_id", "photo"]
+
+
+@dp.message(Command("import"))
+async def import_workers(message: types.Message, state: FSMContext):
+    station_id = await get_head_station(message.from_user.id)
+    if not station_id:
+        return await message.answer("❌ Siz boshliq emassiz.")
+
+    await state.set_state(ImportWorkers.file)
+    await state.set_data({})
+    await message.answer(
+        "📥 Xodimlar ro‘yxatini CSV yoki XLSX fayl qilib yuboring.\n\n"
+        f"Ustunlar tartibi: {'; '.join(roster.HEADER)}\n"
+        "🖼 Rasm ixtiyoriy, faqat http(s) link.\n"
+        "Birinchi qator sarlavha bo‘lishi mumkin.\n\n"
+        f"💼 Lavozimlar: {', '.join(roster.POSITIONS)}\n"
+        f"🕒 Smenalar: {', '.join(roster.SMENAS)}"
+    )
+
+
+async def copy_workers(station_id, workers):
+    # Natija: tabel bandligi sababli xatolar ro‘yxati (bo‘sh bo‘lsa – yozildi)
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            taken = {r["tabel"] for r in await conn.fetch(queries.WORKERS_TABELS_TAKEN, [w[2] for w in workers])}
+            errors = [(w[0], f"tabel {w[2]} bazada allaqachon bor") for w in workers if w[2] in taken]
+            if errors:
+                return errors
+            await conn.copy_records_to_table(
+                "workers",
+                records=[(full_name, tabel, position, smena, station_id, photo)
+                         for _, full_name, tabel, position, smena, photo in workers],
+                columns=WORKER_COPY_COLUMNS,
+            )
+    return []
+
+
+@state_handlers(ImportWorkers.file)
+async def import_workers_file(message: types.Message, state: FSMContext):
+    station_id = await get_head_station(message.from_user.id)
+    if not station_id:
+        await state.clear()
+        return await message.answer("❌ Siz boshliq emassiz.")
+
+    document = message.document
+    if document is None:
+        return await message.answer("❌ CSV yoki XLSX faylni hujjat sifatida yuboring:")
+
+    started = time.perf_counter()
+    data = (await bot.download(document)).getvalue()
+    try:
+        workers, errors = await asyncio.to_thread(
+            roster.parse_roster, document.file_name or "", data, IMPORT_MAX_ROWS
+        )
+    except roster.RosterError as e:
+        return await message.answer(f"❌ {e}")
+    except Exception as e:
+        logger.warning("Import fayli o‘qilmadi (%s): %s", document.file_name, e)
+        return await message.answer("❌ Faylni o‘qib bo‘lmadi. CSV yoki XLSX ekanini tekshiring.")
+
+    if not workers and not errors:
+        return await message.answer("❌ Faylda xodimlar topilmadi.")
+
+    if not errors:
+        try:
+            errors = await copy_workers(station_id, workers)
+        except asyncpg.UniqueViolationError:
+            # Tekshiruvdan keyin kimdir shu tabelni qo‘shib ulgurgan
+            return await message.answer("❌ Yuklash paytida tabel raqamlari band bo‘lib qoldi. Faylni qayta yuboring.")
+
+    if errors:
+        errors.sort()
+        lines = [f"❌ Faylda {len(errors)} ta xato, hech narsa yozilmadi. Tuzatib qayta yuboring:"]
+        lines += [f"{line_no}-qator: {reason}" for line_no, reason in errors[:IMPORT_ERRORS_SHOWN]]
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            lines.append(f"... va yana {len(errors) - IMPORT_ERRORS_SHOWN} ta xato")
+        for chunk in split_text(lines):
+            await message.answer(chunk)
+        return
+
+    await state.clear()
+    station_name = await station_catalog.name(station_id)
+    logger.info("Import: %s bekatiga %d ta xodim, %.0f ms", station_name, len(workers), (time.perf_counter() - started) * 1000)
+    await message.answer(f"✅ {len(workers)} ta xodim qo‘shildi.\n🏢 Bekat: {station_name}", reply_markup=main_kb)
+    send_to_group(f"📥 Fayldan {len(workers)} ta xodim qo‘shildi!\n🏢 Bekat: {station_name}", station_id)
+
+
+# ================================
+# Xodim qidirish: F.I.O yoki tabel bo‘yicha, pg_trgm GIN indeksi orqali
+# bitta so‘rov. Natijalar o‘xshashlik bo‘yicha saralanadi va cheklanadi.
+SEARCH_LIMIT = 20
+SEARCH_MIN_LENGTH = 3
+
+
+def search_pattern(text):
+    # ILIKE maxsus belgilarini ekranlash
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def search_workers(text, station_id=None, limit=SEARCH_LIMIT):
+    if station_id is None:
+        return await db.fetch(queries.WORKERS_SEARCH, text, search_pattern(text), limit)
+    return await db.fetch(queries.WORKERS_SEARCH_STATION, text, search_pattern(text), station_id, limit)
+
+
+async def send_find_results(message, text):
+    rows = await search_workers(text)
+    if not rows:
+        return await message.answer(f"❌ «{text}» bo‘yicha xodim topilmadi.")
+
+    lines = [f"🔎 «{text}» bo‘yicha natijalar ({len(rows)} ta):"]
+    for idx, w in enumerate(rows, start=1):
+        lines.append(
+            f"{idx}. 👤 {w['full_name']} — {w['tabel']}\n"
+            f"   💼 {w['position']} — {w['smena']}\n"
+            f"   🏢 {w['station_name']}"
+        )
+    for chunk in split_text(lines, sep="\n\n"):
+        await message.answer(chunk)
+
+
+@dp.message(Command("find"))
+async def find_worker(message: types.Message, state: FSMContext):
+    if message.from_user.id not in SUPERADMINS:
+        return await message.answer("❌ Sizda ruxsat yo‘q.")
+
+    parts = message.text.split(maxsplit=1)
+    text = " ".join(parts[1].split()) if len(parts) > 1 else ""
+    if len(text) < SEARCH_MIN_LENGTH:
+        await state.set_state(FindWorker.query)
+        return await message.answer("🔎 Xodimning F.I.O si yoki tabel raqamini yozing (kamida 3 ta belgi):")
 
-    user_states.pop(message.from_user.id, None)
+    await state.clear()
+    await send_find_results(message, text)
+
+
+@state_handlers(FindWorker.query)
+async def find_worker_query(message: types.Message, state: FSMContext):
+    text = " ".join((message.text or "").split())
+    if len(text) < SEARCH_MIN_LENGTH:
+        return await message.answer("❌ Kamida 3 ta belgi yozing:")
+
+    await state.clear()
+    await send_find_results(message, text)
 
 
 # ================================
+# /export – xodimlar ro‘yxatini fayl qilib yuborish (superadmin)
+# Masalan: /export xlsx; bekat=Chorsu; lavozim=ДСП; smena=Кечги
+# So‘rov server tomonidagi kursor bilan EXPORT_BATCH tadan o‘qiladi, fayl
+# alohida oqimda yoziladi va bitta hujjat bo‘lib yuboriladi.
+EXPORT_BATCH = 1000
+EXPORT_EXAMPLE = "/export xlsx; bekat=Chorsu; lavozim=ДСП; smena=Кечги"
+
+
+async def parse_export_args(text):
+    fmt, station, position, smena = "csv", None, None, None
+    for part in text.split(";"):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        if part.lower() in ("csv", "xlsx"):
+            fmt = part.lower()
+            continue
+
+        key, sep, value = part.partition("=")
+        key, value = key.strip().lower(), value.strip()
+        if not sep or not value:
+            raise ValueError(f"«{part}» tushunarsiz")
+        if key == "bekat":
+            station = value
+        elif key == "lavozim":
+            position = value.upper()
+            if position not in roster.POSITIONS:
+                raise ValueError(f"«{value}» lavozimi yo‘q")
+        elif key == "smena":
+            smena = roster.normalize_smena(value)
+            if smena not in roster.SMENAS:
+                raise ValueError(f"«{value}» smenasi yo‘q")
+        else:
+            raise ValueError(f"«{key}» filtri yo‘q")
+
+    station_id = None
+    if station is not None:
+        station_id = await station_catalog.id(station)
+        if station_id is None:
+            # Katta-kichik harfga qaramasdan qidiramiz
+            station_id = next((sid for sid, name in await station_catalog.items() if name.lower() == station.lower()), None)
+        if station_id is None:
+            raise ValueError(f"«{station}» bekati topilmadi")
+    return fmt, station_id, position, smena
+
+
+async def export_workers(fmt, station_id, position, smena):
+    fd, path = tempfile.mkstemp(prefix="xodimlar_", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        writer = await asyncio.to_thread(roster.RosterWriter, fmt, path)
+        try:
+            async with db.acquire() as conn:
+                # Kursor faqat tranzaksiya ichida ishlaydi
+                async with conn.transaction():
+                    cursor = await conn.cursor(queries.WORKERS_EXPORT, station_id, position, smena)
+                    while rows := await cursor.fetch(EXPORT_BATCH):
+                        await asyncio.to_thread(writer.write, rows)
+        finally:
+            await asyncio.to_thread(writer.close)
+        return path, writer.count
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+@dp.message(Command("export"))
+async def export_command(message: types.Message):
+    if message.from_user.id not in SUPERADMINS:
+        return await message.answer("❌ Sizda ruxsat yo‘q.")
+
+    parts = message.text.split(maxsplit=1)
+    try:
+        fmt, station_id, position, smena = await parse_export_args(parts[1] if len(parts) > 1 else "")
+    except ValueError as e:
+        return await message.answer(f"❌ {e}\n\nMasalan: {EXPORT_EXAMPLE}")
+
+    started = time.perf_counter()
+    try:
+        path, count = await export_workers(fmt, station_id, position, smena)
+    except roster.RosterError as e:
+        return await message.answer(f"❌ {e}")
+
+    try:
+        if not count:
+            return await message.answer("❌ Bu filtrlar bo‘yicha xodim topilmadi.")
+        logger.info("Eksport: %d ta xodim, %.0f ms", count, (time.perf_counter() - started) * 1000)
+        await message.answer_document(
+            FSInputFile(path, filename=f"xodimlar_{time.strftime('%Y%m%d_%H%M')}.{fmt}"),
+            caption=f"📤 {count} ta xodim"
+        )
+    finally:
+        os.remove(path)
+
+
+# ================================
+# Xodim tanlash ro‘yxati (tahrirlash va o‘chirish uchun umumiy)
+# Har sahifa (station_id, id) kursori bilan bitta so‘rov; tugma xodim ID sini
+# o‘zi olib yuradi: wpk:<rejim>:<worker_id>, sahifalar: wpg:<rejim>:<yo‘nalish>:<id>.
+# Rejim: e – tahrirlash, d – o‘chirish.
+WORKER_PICK_PAGE_SIZE = 20
+
+
+async def fetch_worker_pick_page(station_id, direction, worker_id, limit=WORKER_PICK_PAGE_SIZE):
+    if direction == "next":
+        rows = await db.fetch(queries.WORKERS_PICK_NEXT, station_id, worker_id, limit + 1)
+        has_more = len(rows) > limit
+        return rows[:limit], worker_id != 0, has_more
+
+    rows = await db.fetch(queries.WORKERS_PICK_PREV, station_id, worker_id, limit + 1)
+    has_more = len(rows) > limit
+    return list(reversed(rows[:limit])), has_more, True
+
+
+def worker_pick_markup(mode, rows, has_prev, has_next):
+    kb = InlineKeyboardBuilder()
+    for w in rows:
+        kb.button(text=f"{w['full_name']} — {w['tabel']}", callback_data=f"wpk:{mode}:{w['id']}")
+    kb.adjust(1)
+
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"wpg:{mode}:prev:{rows[0]['id']}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"wpg:{mode}:next:{rows[-1]['id']}"))
+    if nav:
+        kb.row(*nav)
+    return kb.as_markup()
+
+
+@dp.callback_query(F.data.startswith("wpg:"))
+async def worker_pick_page(callback: types.CallbackQuery):
+    station_id = await get_head_station(callback.from_user.id)
+    if not station_id:
+        return await callback.answer("❌ Siz boshliq emassiz.", show_alert=True)
+
+    _, mode, direction, worker_id = callback.data.split(":")
+    rows, has_prev, has_next = await fetch_worker_pick_page(station_id, direction, int(worker_id))
+    if not rows:
+        return await callback.answer("❌ Xodimlar topilmadi.", show_alert=True)
+
+    await callback.message.edit_reply_markup(reply_markup=worker_pick_markup(mode, rows, has_prev, has_next))
+    await callback.answer()
+
+
+# Tanlash paytida yozilgan matn – shu bekat xodimlari ichida qidiruv
+async def search_pick(message, mode):
+    station_id = await get_head_station(message.from_user.id)
+    if not station_id:
+        return await message.answer("❌ Siz boshliq emassiz.")
+
+    text = " ".join((message.text or "").split())
+    if len(text) < SEARCH_MIN_LENGTH:
+        return await message.answer("❌ Qidirish uchun kamida 3 ta belgi yozing yoki ro‘yxatdagi tugmadan tanlang.")
 
+    rows = await search_workers(text, station_id)
+    if not rows:
+        return await message.answer(f"❌ «{text}» bo‘yicha xodim topilmadi. Boshqacha yozib ko‘ring:")
+    await message.answer(f"🔎 «{text}» bo‘yicha natijalar:", reply_markup=worker_pick_markup(mode, rows, False, False))
+
+
+# ================================
 # Bekat boshlig‘i – xodimni o‘zgartirish
 @dp.message(F.text == "✏️ Xodimni o'zgartirish")
-async def choose_worker(message: types.Message):
+async def choose_worker(message: types.Message, state: FSMContext):
     station_id = await get_head_station(message.from_user.id)
     if not station_id:
         return await message.answer("❌ Siz boshliq emassiz.")
 
-    workers = await db_conn.fetch(
-        "SELECT id, full_name, tabel FROM workers WHERE station_id=$1 ORDER BY id",
-        station_id
-    )
-    if not workers:
+    rows, has_prev, has_next = await fetch_worker_pick_page(station_id, "next", 0)
+    if not rows:
         return await message.answer("❌ Sizda hozircha xodimlar yo‘q.")
 
-    text = "👥 Xodimlar ro‘yxati:\n\n"
-    for i, w in enumerate(workers, start=1):
-        text += f"{i}. {w['full_name']} — {w['tabel']}\n "
-
-    user_states[message.from_user.id] = {"state": "choose_worker", "workers": workers}
-    await message.answer(text + "\n✏️ Qaysi xodimni tahrir qilmoqchisiz? Raqam yuboring:")
+    await state.set_state(EditWorker.choose)
+    await state.set_data({})
+    await message.answer(
+        "✏️ Qaysi xodimni tahrir qilmoqchisiz?\n🔎 Yoki F.I.O / tabel raqamini yozib qidiring.",
+        reply_markup=worker_pick_markup("e", rows, has_prev, has_next)
+    )
 
 
 # ================================
 # Xodim tanlash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "choose_worker")
-async def show_worker_info(message: types.Message):
-    state = user_states.get(message.from_user.id)
-    workers = state["workers"]
+@dp.callback_query(EditWorker.choose, F.data.startswith("wpk:e:"))
+async def show_worker_info(callback: types.CallbackQuery, state: FSMContext):
+    station_id = await get_head_station(callback.from_user.id)
+    worker_id = int(callback.data.split(":")[2])
+    worker = await db.fetchrow(queries.WORKER_OF_STATION, worker_id, station_id)
+    if worker is None:
+        return await callback.answer("❌ Xodim topilmadi.", show_alert=True)
 
-    if not message.text.isdigit() or not (1 <= int(message.text) <= len(workers)):
-        return await message.answer("❌ Noto‘g‘ri raqam. Qayta kiriting:")
+    await callback.message.edit_text(f"✏️ {worker['full_name']} — {worker['tabel']}")
+    await callback.answer()
+    await show_worker_fields(state, callback, worker_id)
 
-    idx = int(message.text) - 1
-    worker = workers[idx]
-    worker_id = worker["id"]
 
-    await show_worker_fields(message.from_user.id, message, worker_id)
+@state_handlers(EditWorker.choose)
+async def edit_choose_search(message: types.Message, state: FSMContext):
+    await search_pick(message, "e")
 
 
 # ================================
 # Umumiy funksiya: xodim maydonlarini chiqarish
-async def show_worker_fields(user_id, message_or_callback, worker_id):
-    db_worker = await db_conn.fetchrow("SELECT * FROM workers WHERE id=$1", worker_id)
-    station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", db_worker["station_id"])
+async def show_worker_fields(state, message_or_callback, worker_id):
+    db_worker = await db.fetchrow(queries.WORKER_BY_ID, worker_id)
+    station_name = await station_catalog.name(db_worker["station_id"])
 
     text = (
         f"1. 👤 F.I.O: {db_worker['full_name']}\n"
@@ -698,20 +1777,22 @@ async def show_worker_fields(user_id, message_or_callback, worker_id):
         f"6. 🖼 Rasm\n"
     )
 
-    user_states[user_id] = {"state": "edit_worker_field", "worker_id": worker_id}
+    await state.set_state(EditWorker.field)
+    await state.set_data({"worker_id": worker_id})
 
     # Agar rasm bor bo‘lsa, uni chiqaramiz
     if db_worker["photo"]:
         if isinstance(message_or_callback, types.Message):
-            await message_or_callback.answer_photo(
-                photo=db_worker["photo"], 
+            sent = await message_or_callback.answer_photo(
+                photo=worker_photo(db_worker), 
                 caption=text + "\n✏️ Qaysi maydonni o‘zgartirasiz? Raqam yuboring:"
             )
         else:
-            await message_or_callback.message.answer_photo(
-                photo=db_worker["photo"], 
+            sent = await message_or_callback.message.answer_photo(
+                photo=worker_photo(db_worker), 
                 caption=text + "\n✏️ Qaysi maydonni o‘zgartirasiz? Raqam yuboring:"
             )
+        await remember_photo_file_ids([(db_worker, sent)])
     else:
         if isinstance(message_or_callback, types.Message):
             await message_or_callback.answer(text + "\n✏️ Qaysi maydonni o‘zgartirasiz? Raqam yuboring:")
@@ -721,10 +1802,9 @@ async def show_worker_fields(user_id, message_or_callback, worker_id):
 
 # ================================
 # Maydonni tanlash va o‘zgartirish
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "edit_worker_field")
-async def edit_worker_field(message: types.Message):
-    state = user_states[message.from_user.id]
-    worker_id = state["worker_id"]
+@state_handlers(EditWorker.field)
+async def edit_worker_field(message: types.Message, state: FSMContext):
+    worker_id = (await state.get_data())["worker_id"]
 
     if not message.text.isdigit() or not (1 <= int(message.text) <= 6):
         return await message.answer("❌ Noto‘g‘ri raqam. Qayta kiriting:")
@@ -732,11 +1812,11 @@ async def edit_worker_field(message: types.Message):
     choice = int(message.text)
 
     if choice == 1:  # FIO
-        state["state"] = "edit_fullname"
+        await state.set_state(EditWorker.full_name)
         return await message.answer("✏️ Yangi F.I.O ni kiriting:")
 
     elif choice == 2:  # Tabel
-        state["state"] = "edit_tabel"
+        await state.set_state(EditWorker.tabel)
         return await message.answer("✏️ Yangi tabel raqam (5 xonali) kiriting:")
 
     elif choice == 3:  # Lavozim
@@ -748,26 +1828,18 @@ async def edit_worker_field(message: types.Message):
         return await message.answer("💼 Yangi lavozimni tanlang:", reply_markup=kb.as_markup())
 
     elif choice == 4:  # Smena (inline qilib beramiz)
-        smena_variants = [
-            "Кундузги", "Кечги", "ТМТ",
-            "17 режим", "17 режим кундузги 7-19", "15 - режим 8-20"
-        ]
         kb = InlineKeyboardBuilder()
-        for sm in smena_variants:
+        for sm in roster.SMENAS:
             kb.button(text=sm, callback_data=f"edit_smena:{worker_id}:{sm}")
         kb.adjust(2)
         return await message.answer("🕒 Yangi smenani tanlang:", reply_markup=kb.as_markup())
 
     elif choice == 5:  # Bekat
-        stations = await db_conn.fetch("SELECT id, name FROM stations ORDER BY id")
-        kb = InlineKeyboardBuilder()
-        for st in stations:
-            kb.button(text=st["name"], callback_data=f"changestation:{worker_id}:{st['id']}")  
-        kb.adjust(2)
-        return await message.answer("🏢 Yangi bekatni tanlang:", reply_markup=kb.as_markup())
+        kb = await station_keyboards.get("changestation", worker_id)
+        return await message.answer("🏢 Yangi bekatni tanlang:", reply_markup=kb)
 
     elif choice == 6:  # Rasm
-        state["state"] = "edit_photo"
+        await state.set_state(EditWorker.photo)
         return await message.answer("🖼 Yangi rasmni yuboring (jpg/png):")
 
 
@@ -775,77 +1847,77 @@ async def edit_worker_field(message: types.Message):
 # ================================
 # Inline callback – Lavozimni yangilash
 @dp.callback_query(F.data.startswith("edit_position"))
-async def process_edit_position(call: types.CallbackQuery):
+async def process_edit_position(call: types.CallbackQuery, state: FSMContext):
     _, worker_id, pos = call.data.split(":")
-    await db_conn.execute("UPDATE workers SET position=$1 WHERE id=$2", pos, int(worker_id))
+    await db.execute(queries.WORKER_SET_POSITION, pos, int(worker_id))
     await call.answer("✅ Lavozim yangilandi")
-    await ask_edit_more(call.from_user.id, call, int(worker_id))
+    await ask_edit_more(state, call, int(worker_id))
 
 
 # Inline callback – Smena yangilash
 @dp.callback_query(F.data.startswith("edit_smena"))
-async def process_edit_smena(call: types.CallbackQuery):
+async def process_edit_smena(call: types.CallbackQuery, state: FSMContext):
     _, worker_id, smena = call.data.split(":", 2)  # faqat 2 qismga emas, 3 qismga bo‘lamiz
-    await db_conn.execute("UPDATE workers SET smena=$1 WHERE id=$2", smena, int(worker_id))
+    await db.execute(queries.WORKER_SET_SMENA, smena, int(worker_id))
     await call.answer("✅ Smena yangilandi")
-    await ask_edit_more(call.from_user.id, call, int(worker_id))
+    await ask_edit_more(state, call, int(worker_id))
 
 
 # Inline callback – Bekat yangilash
 @dp.callback_query(F.data.startswith("changestation"))
-async def process_change_station(call: types.CallbackQuery):
+async def process_change_station(call: types.CallbackQuery, state: FSMContext):
     _, worker_id, station_id = call.data.split(":")
-    await db_conn.execute("UPDATE workers SET station_id=$1 WHERE id=$2", int(station_id), int(worker_id))
+    await db.execute(queries.WORKER_SET_STATION, int(station_id), int(worker_id))
     await call.answer("✅ Bekat yangilandi")
-    await ask_edit_more(call.from_user.id, call, int(worker_id))
+    await ask_edit_more(state, call, int(worker_id))
 
 
 # ================================
 # FIO yangilash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "edit_fullname")
-async def process_edit_fullname(message: types.Message):
-    state = user_states[message.from_user.id]
-    worker_id = state["worker_id"]
+@state_handlers(EditWorker.full_name)
+async def process_edit_fullname(message: types.Message, state: FSMContext):
+    worker_id = (await state.get_data())["worker_id"]
 
-    await db_conn.execute("UPDATE workers SET full_name=$1 WHERE id=$2", message.text, worker_id)
+    await db.execute(queries.WORKER_SET_FULL_NAME, message.text, worker_id)
     await message.answer("✅ F.I.O yangilandi")
-    await ask_edit_more(message.from_user.id, message, worker_id)
+    await ask_edit_more(state, message, worker_id)
 
 
 # ================================
 # Tabel yangilash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "edit_tabel")
-async def process_edit_tabel(message: types.Message):
-    state = user_states[message.from_user.id]
-    worker_id = state["worker_id"]
+@state_handlers(EditWorker.tabel)
+async def process_edit_tabel(message: types.Message, state: FSMContext):
+    worker_id = (await state.get_data())["worker_id"]
 
-    if not message.text.isdigit() or len(message.text) != 5:
+    if not roster.valid_tabel(message.text):
         return await message.answer("❌ Tabel raqam 5 xonali son bo‘lishi kerak. Qayta kiriting:")
 
-    await db_conn.execute("UPDATE workers SET tabel=$1 WHERE id=$2", message.text, worker_id)
+    try:
+        await db.execute(queries.WORKER_SET_TABEL, message.text, worker_id)
+    except asyncpg.UniqueViolationError:
+        return await message.answer("❌ Bu tabel raqamli xodim allaqachon mavjud. Boshqa tabel kiriting:")
     await message.answer("✅ Tabel yangilandi")
-    await ask_edit_more(message.from_user.id, message, worker_id)
+    await ask_edit_more(state, message, worker_id)
 
 
 # ================================
 # Rasmni yangilash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "edit_photo", F.photo)
-async def process_edit_photo(message: types.Message):
-    state = user_states[message.from_user.id]
-    worker_id = state["worker_id"]
+@state_handlers(EditWorker.photo, F.photo)
+async def process_edit_photo(message: types.Message, state: FSMContext):
+    worker_id = (await state.get_data())["worker_id"]
 
     # Eng sifatli variantni olish
     file_id = message.photo[-1].file_id
 
-    await db_conn.execute("UPDATE workers SET photo=$1 WHERE id=$2", file_id, worker_id)
+    await db.execute(queries.WORKER_SET_PHOTO, file_id, worker_id)
     await message.answer("✅ Rasm yangilandi")
 
-    await ask_edit_more(message.from_user.id, message, worker_id)
+    await ask_edit_more(state, message, worker_id)
 
 
 # ================================
 # O‘zgartirishdan keyin "Ha / Yo‘q" tugmasi
-async def ask_edit_more(user_id, message_or_callback, worker_id):
+async def ask_edit_more(state, message_or_callback, worker_id):
     kb = ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text="Ha"), KeyboardButton(text="Yo‘q")]],
         resize_keyboard=True
@@ -855,37 +1927,38 @@ async def ask_edit_more(user_id, message_or_callback, worker_id):
     else:
         await message_or_callback.message.answer("🔄 Yana boshqa maydonni o‘zgartirasizmi?", reply_markup=kb)
 
-    user_states[user_id] = {"state": "edit_more", "worker_id": worker_id}
+    await state.set_state(EditWorker.more)
+    await state.set_data({"worker_id": worker_id})
 
 
 # ================================
 # ================================
 # Ha / Yo‘q tugmalarini qayta ishlash
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "edit_more")
-async def edit_more_choice(message: types.Message):
-    state = user_states[message.from_user.id]
-    worker_id = state["worker_id"]
+@state_handlers(EditWorker.more)
+async def edit_more_choice(message: types.Message, state: FSMContext):
+    worker_id = (await state.get_data())["worker_id"]
 
     if message.text == "Ha":
-        await show_worker_fields(message.from_user.id, message, worker_id)
+        await show_worker_fields(state, message, worker_id)
 
     elif message.text == "Yo‘q":
         # ✅ Saqlashdan oldin xodimning yangilangan ma’lumotlarini olib kelamiz
-        worker = await db_conn.fetchrow("SELECT * FROM workers WHERE id=$1", worker_id)
-        station_name = await db_conn.fetchval("SELECT name FROM stations WHERE id=$1", worker["station_id"])
+        worker = await db.fetchrow(queries.WORKER_BY_ID, worker_id)
+        station_name = await station_catalog.name(worker["station_id"])
 
         # Guruhga xabar yuborish
-        await send_to_group(
+        send_to_group(
             f"✏️ Xodim ma’lumotlari yangilandi!📌\n\n"
             f"👤 F.I.O: {worker['full_name']}\n"
             f"🔢 Tabel: {worker['tabel']}\n"
             f"💼 Lavozim: {worker['position']}\n"
             f"🕒 Smena: {worker['smena']}\n"
-            f"🏢 Bekat: {station_name}"
+            f"🏢 Bekat: {station_name}",
+            worker["station_id"],
         )
 
         # State tozalash
-        user_states.pop(message.from_user.id, None)
+        await state.clear()
 
         # ✅ Saqlangandan keyin bosh menyu qaytariladi
         await message.answer("✅ O‘zgarishlar saqlandi.", reply_markup=main_kb)
@@ -898,35 +1971,31 @@ async def edit_more_choice(message: types.Message):
 # ================================
 # Bekat boshlig‘i – xodimni o‘chirish
 @dp.message(F.text == "❌ Xodimni o'chirish")
-async def choose_worker_delete(message: types.Message):
+async def choose_worker_delete(message: types.Message, state: FSMContext):
     station_id = await get_head_station(message.from_user.id)
     if not station_id:
         return await message.answer("❌ Siz boshliq emassiz.")
 
-    workers = await db_conn.fetch("SELECT id, full_name, tabel FROM workers WHERE station_id=$1", station_id)
-    if not workers:
+    rows, has_prev, has_next = await fetch_worker_pick_page(station_id, "next", 0)
+    if not rows:
         return await message.answer("❌ Sizda hozircha xodimlar yo‘q.")
 
-    text = "🗑 Xodimlar ro‘yxati:\n\n"
-    for i, w in enumerate(workers, start=1):
-        text += f"{i}. {w['full_name']} | Tabel: {w['tabel']}\n"
-
-    user_states[message.from_user.id] = {"state": "delete_worker", "workers": workers}
-    await message.answer(text + "\n✏️ Qaysi xodimni o'chirmoqchisiz? Raqam yuboring:")
+    await state.set_state(DeleteWorker.choose)
+    await state.set_data({})
+    await message.answer(
+        "🗑 Qaysi xodimni o'chirmoqchisiz?\n🔎 Yoki F.I.O / tabel raqamini yozib qidiring.",
+        reply_markup=worker_pick_markup("d", rows, has_prev, has_next)
+    )
 
 # ================================
-# Xodim raqamini qabul qilish va o'chirish
-@dp.message(lambda m: user_states.get(m.from_user.id, {}).get("state") == "delete_worker")
-async def delete_worker_confirm(message: types.Message):
-    state = user_states[message.from_user.id]
-    workers = state["workers"]
-
-    if not message.text.isdigit() or not (1 <= int(message.text) <= len(workers)):
-        return await message.answer("❌ Noto‘g‘ri raqam. Qayta kiriting:")
-
-    idx = int(message.text) - 1
-    worker = workers[idx]
-    worker_id = worker["id"]
+# Xodim tanlanganda o'chirishni tasdiqlash
+@dp.callback_query(DeleteWorker.choose, F.data.startswith("wpk:d:"))
+async def delete_worker_confirm(callback: types.CallbackQuery, state: FSMContext):
+    station_id = await get_head_station(callback.from_user.id)
+    worker_id = int(callback.data.split(":")[2])
+    worker = await db.fetchrow(queries.WORKER_OF_STATION, worker_id, station_id)
+    if worker is None:
+        return await callback.answer("❌ Xodim topilmadi.", show_alert=True)
 
     # Inline tugma bilan tasdiqlash
     kb = InlineKeyboardBuilder()
@@ -934,32 +2003,87 @@ async def delete_worker_confirm(message: types.Message):
     kb.button(text="❌ Bekor qilish", callback_data="cancel_delete")
     kb.adjust(2)
 
-    await message.answer(f"⚠️ {worker['full_name']} ni o‘chirmoqchimisiz?", reply_markup=kb.as_markup())
-    user_states[message.from_user.id]["state"] = "delete_confirm"
-    user_states[message.from_user.id]["worker_id"] = worker_id
+    await callback.message.edit_text(f"⚠️ {worker['full_name']} ni o‘chirmoqchimisiz?", reply_markup=kb.as_markup())
+    await callback.answer()
+    await state.set_state(DeleteWorker.confirm)
+    await state.set_data({"worker_id": worker_id})
+
+
+@state_handlers(DeleteWorker.choose)
+async def delete_choose_search(message: types.Message, state: FSMContext):
+    await search_pick(message, "d")
 
 # ================================
 # Inline callback – xodimni o'chirish
 @dp.callback_query(F.data.startswith("confirm_delete"))
-async def process_delete_worker(call: types.CallbackQuery):
+async def process_delete_worker(call: types.CallbackQuery, state: FSMContext):
     _, worker_id = call.data.split(":")
-    await db_conn.execute("DELETE FROM workers WHERE id=$1", int(worker_id))
+    await db.execute(queries.WORKER_DELETE, int(worker_id))
     await call.answer("✅ Xodim o‘chirildi")
     await call.message.edit_text("✅ Xodim muvaffaqiyatli o‘chirildi.")
-    user_states.pop(call.from_user.id, None)
+    await state.clear()
 
 # ================================
 # Bekor qilish callback
 @dp.callback_query(F.data == "cancel_delete")
-async def cancel_delete_worker(call: types.CallbackQuery):
+async def cancel_delete_worker(call: types.CallbackQuery, state: FSMContext):
     await call.message.edit_text("❌ Xodimni o‘chirish bekor qilindi.")
-    user_states.pop(call.from_user.id, None)
+    await state.clear()
+
+
+
+# ================================
+# Holat handlerlari oxirida ro‘yxatdan o‘tadi: komandalar va menyu tugmalari
+# har doim ustun turadi, qolgan xabarlar holat bo‘yicha bitta qidiruvda
+# kerakli handlerga yuboriladi.
+state_handlers.attach(dp.message)
+
 
+# ================================
+# Ishga tushirish va to‘xtatish (polling va webhook uchun umumiy)
+@dp.startup()
+async def on_startup(bot: Bot):
+    started = time.perf_counter()
+    await setup_db()
+    notifier.start()
+    if BOT_MODE == "webhook":
+        await bot.set_webhook(
+            f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    else:
+        # Avval webhook o‘rnatilgan bo‘lsa, polling ishlamaydi
+        await bot.delete_webhook()
+    logger.info("Ishga tushish: %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+@dp.shutdown()
+async def on_shutdown():
+    # Webhook bir nechta instansda ishlashi mumkin, shuning uchun o‘chirilmaydi
+    await notifier.stop()
+    await db.close()
+
+
+def run_webhook():
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError("Webhook rejimi uchun WEBHOOK_URL va WEBHOOK_SECRET kerak")
+
+    app = web.Application()
+    # Avval startup/shutdown: to‘xtashda navbat bot sessiyasi yopilishidan oldin yuboriladi
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
 
 
 async def main(): 
-    await setup_db() 
-    await dp.start_polling(bot)
+    await dp.start_polling(bot, tasks_concurrency_limit=UPDATE_CONCURRENCY)
     
 if __name__ == "__main__": 
-    asyncio.run(main())
+    logging.basicConfig(level=logging.INFO)
+    if BOT_MODE == "webhook":
+        run_webhook()
+    elif BOT_MODE == "polling":
+        asyncio.run(main())
+    else:
+        raise ValueError(f"BOT_MODE noto‘g‘ri: {BOT_MODE!r} (polling yoki webhook)")
@@ -0,0 +1,124 @@
+# ================================
+# Sxema migratsiyalari
+#
+# migrations/ papkasidagi NNNN_nom.sql fayllar raqam tartibida bir marta
+# qo‘llanadi, qo‘llangan versiyalar schema_migrations jadvalida saqlanadi.
+# Bir nechta nusxa bir vaqtda ishga tushsa, advisory lock ularni navbatga qo‘yadi.
+# Lock pg_try_advisory_lock bilan so‘rab turiladi: bloklovchi pg_advisory_lock
+# kutayotganda snapshot ushlab turadi va CREATE INDEX CONCURRENTLY uni kutib
+# deadlock bo‘ladi.
+#
+# Odatda har bir fayl bitta tranzaksiyada bajariladi. Birinchi qatori
+# "-- migrate: no-transaction" bo‘lgan fayl (masalan CREATE INDEX CONCURRENTLY)
+# tranzaksiyasiz, buyruqma-buyruq bajariladi – unda har bir buyruq ";" bilan
+# qator oxirida tugashi kerak. Oldingi urinishdan qolgan yaroqsiz (INVALID)
+# CONCURRENTLY indeks qayta yaratishdan oldin o‘chiriladi.
+import asyncio
+import logging
+import re
+from pathlib import Path
+
+logger = logging.getLogger("info_bot")
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+LOCK_ID = 7_240_315  # pg_advisory_lock kaliti, faqat shu bot uchun
+LOCK_POLL = 0.5  # lock band bo‘lsa qayta so‘rash oralig‘i, soniya
+NO_TRANSACTION = "-- migrate: no-transaction"
+_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+([\w.]+)", re.IGNORECASE
+)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for path in Path(directory).iterdir():
+        match = _FILE_RE.match(path.name)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), path.read_text(encoding="utf-8")))
+    migrations.sort()
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"{directory} ichida bir xil raqamli migratsiyalar bor")
+    return migrations
+
+
+async def applied_versions(conn):
+    exists = await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not exists:
+        return set()
+    return {r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations")}
+
+
+def _log_notice(conn, message):
+    logger.warning("migratsiya: %s", message.message)
+
+
+async def _drop_invalid_index(conn, statement):
+    # CREATE INDEX CONCURRENTLY yarim yo‘lda to‘xtasa INVALID indeks qoladi,
+    # qayta urinishda IF NOT EXISTS esa uni o‘tkazib yuboradi
+    match = _CONCURRENT_INDEX_RE.search(statement)
+    if not match:
+        return
+    index = match.group(1)
+    invalid = await conn.fetchval(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index
+    )
+    if invalid:
+        logger.warning("%s indeksi yaroqsiz (INVALID), qayta yaratiladi", index)
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+
+async def _apply(conn, version, name, sql):
+    if sql.lstrip().startswith(NO_TRANSACTION):
+        for statement in sql.split(";\n"):
+            if statement.strip():
+                await _drop_invalid_index(conn, statement)
+                await conn.execute(statement)
+        await conn.execute(
+            "INSERT INTO schema_migrations(version, name) VALUES($1, $2)", version, name
+        )
+        return
+
+    async with conn.transaction():
+        await conn.execute(sql)
+        await conn.execute(
+            "INSERT INTO schema_migrations(version, name) VALUES($1, $2)", version, name
+        )
+
+
+async def migrate(conn, directory=MIGRATIONS_DIR):
+    migrations = load_migrations(directory)
+
+    # Tezkor yo‘l: sxema joriy bo‘lsa lock ham, DDL ham yo‘q
+    applied = await applied_versions(conn)
+    if all(version in applied for version, _, _ in migrations):
+        return []
+
+    while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LOCK_ID):
+        await asyncio.sleep(LOCK_POLL)
+    conn.add_log_listener(_log_notice)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        # Lock kutilayotganda boshqa nusxa qo‘llagan bo‘lishi mumkin
+        applied = await applied_versions(conn)
+
+        done = []
+        for version, name, sql in migrations:
+            if version in applied:
+                continue
+            logger.info("Migratsiya %04d_%s qo‘llanmoqda", version, name)
+            await _apply(conn, version, name, sql)
+            done.append(version)
+        return done
+    finally:
+        conn.remove_log_listener(_log_notice)
+        await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_ID)
@@ -0,0 +1,22 @@
+-- Boshlang‘ich jadvallar. IF NOT EXISTS – migratsiyalardan oldin yaratilgan
+-- bazalarda ham xatosiz o‘tadi.
+CREATE TABLE IF NOT EXISTS stations (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id SERIAL PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    tabel VARCHAR(10) NOT NULL,
+    position TEXT NOT NULL,
+    smena TEXT NOT NULL,
+    station_id INT REFERENCES stations(id) ON DELETE CASCADE,
+    photo TEXT
+);
+
+CREATE TABLE IF NOT EXISTS station_heads (
+    id SERIAL PRIMARY KEY,
+    head_telegram_id BIGINT UNIQUE,
+    station_id INT REFERENCES stations(id) ON DELETE CASCADE
+);
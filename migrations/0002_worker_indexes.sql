@@ -0,0 +1,6 @@
+-- Bekat bo‘yicha xodimlar ro‘yxati (WHERE station_id=$1 ORDER BY id)
+-- indeks bo‘yicha oraliq skanerlash bo‘lib qolsin
+CREATE INDEX IF NOT EXISTS workers_station_id_id_idx ON workers(station_id, id);
+CREATE INDEX IF NOT EXISTS station_heads_station_id_idx ON station_heads(station_id);
+
+-- Tabel raqamining unique indeksi 0006 da.
@@ -0,0 +1,9 @@
+-- FSM_STORAGE=postgres uchun suhbat holatlari
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS fsm_states_updated_at_idx ON fsm_states(updated_at);
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- /find va tanlash ro‘yxatidagi qidiruv uchun trigram indekslar.
+-- CONCURRENTLY – katta jadvalda ham yozuvlar to‘xtab qolmaydi.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS workers_full_name_trgm_idx ON workers USING gin (full_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS workers_tabel_trgm_idx ON workers USING gin (tabel gin_trgm_ops);
@@ -0,0 +1,3 @@
+-- URL rasm birinchi marta yuborilgach Telegram qaytargan file_id.
+-- Keyingi yuborishlarda URL qayta yuklanmaydi.
+ALTER TABLE workers ADD COLUMN IF NOT EXISTS photo_file_id TEXT;
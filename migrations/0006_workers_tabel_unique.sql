@@ -0,0 +1,21 @@
+-- Tabel raqami takrorlanmasin. Bazada takroriy tabellar bo‘lsa migratsiya
+-- xato bilan to‘xtaydi va qo‘llangan deb yozilmaydi: takroriylar qo‘lda
+-- tuzatilgach keyingi ishga tushishda qayta urinadi.
+DO $$
+DECLARE
+    dups TEXT;
+BEGIN
+    SELECT string_agg(tabel || ' (' || cnt || ')', ', ') INTO dups
+    FROM (
+        SELECT tabel, COUNT(*) AS cnt FROM workers
+        GROUP BY tabel HAVING COUNT(*) > 1
+    ) d;
+
+    IF dups IS NOT NULL THEN
+        RAISE EXCEPTION 'workers.tabel uchun unique indeks yaratib bo‘lmadi, takroriy tabellar: %', dups
+            USING HINT = 'Takroriy tabellarni tuzating va botni qayta ishga tushiring.';
+    END IF;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS workers_tabel_key ON workers(tabel);
+END
+$$;
@@ -0,0 +1,209 @@
+# ================================
+# SQL so‘rovlar ro‘yxati (registry)
+#
+# Handlerlardagi barcha so‘rovlar shu yerda nomi bilan e’lon qilinadi, shuning
+# uchun SQL bitta joyda ko‘rinadi. Database har bir pul ulanishi ochilganda
+# ularni oldindan tayyorlaydi (prepare) va reja qayta ishlatiladi.
+# Konstantalar oddiy str: asyncpg faqat aniq str qabul qiladi.
+from textwrap import dedent
+
+REGISTRY = {}  # nom -> SQL
+NAMES = {}  # SQL -> nom
+
+
+def q(name, sql):
+    if name in REGISTRY:
+        raise ValueError(f"{name} so‘rovi allaqachon bor")
+    query = REGISTRY[name] = dedent(sql).strip()
+    if query in NAMES:
+        raise ValueError(f"{name} va {NAMES[query]} so‘rovlari bir xil")
+    NAMES[query] = name
+    return query
+
+
+# ================================
+# Bekatlar va boshliqlar
+STATIONS_ALL = q("stations_all", "SELECT id, name FROM stations ORDER BY id")
+
+HEADS_ALL = q("heads_all", "SELECT head_telegram_id, station_id FROM station_heads")
+
+# /delete_head sahifasi: head_telegram_id kursori, bekat nomi bilan birga
+HEADS_PAGE_NEXT = q("heads_page_next", """
+    SELECT h.head_telegram_id, h.station_id, s.name AS station_name
+    FROM station_heads h LEFT JOIN stations s ON s.id = h.station_id
+    WHERE h.head_telegram_id > $1
+    ORDER BY h.head_telegram_id
+    LIMIT $2
+""")
+
+HEADS_PAGE_PREV = q("heads_page_prev", """
+    SELECT h.head_telegram_id, h.station_id, s.name AS station_name
+    FROM station_heads h LEFT JOIN stations s ON s.id = h.station_id
+    WHERE h.head_telegram_id < $1
+    ORDER BY h.head_telegram_id DESC
+    LIMIT $2
+""")
+
+HEAD_STATION = q("head_station", "SELECT station_id FROM station_heads WHERE head_telegram_id=$1")
+
+HEADS_BY_STATION = q("heads_by_station", "SELECT head_telegram_id FROM station_heads WHERE station_id=$1")
+
+HEAD_UPSERT = q("head_upsert", """
+    INSERT INTO station_heads(head_telegram_id, station_id)
+    VALUES($1, $2)
+    ON CONFLICT(head_telegram_id) DO UPDATE SET station_id=$2
+""")
+
+HEAD_MOVE = q("head_move", "UPDATE station_heads SET station_id=$1 WHERE head_telegram_id=$2")
+
+HEAD_DELETE = q("head_delete", "DELETE FROM station_heads WHERE head_telegram_id=$1 RETURNING station_id")
+
+# ================================
+# Xodimlar
+WORKER_COLUMNS = "id, full_name, tabel, position, smena, station_id, photo, photo_file_id"
+
+WORKERS_BY_STATION = q("workers_by_station", f"""
+    SELECT {WORKER_COLUMNS} FROM workers WHERE station_id=$1 ORDER BY id
+""")
+
+WORKERS_ROSTER = q("workers_roster", """
+    SELECT id, full_name, tabel, position, smena FROM workers WHERE station_id=$1 ORDER BY id
+""")
+
+# Tahrirlash/o‘chirish uchun tanlash ro‘yxati: (station_id, id) kursori
+WORKERS_PICK_NEXT = q("workers_pick_next", """
+    SELECT id, full_name, tabel FROM workers
+    WHERE station_id=$1 AND id > $2
+    ORDER BY id
+    LIMIT $3
+""")
+
+WORKERS_PICK_PREV = q("workers_pick_prev", """
+    SELECT id, full_name, tabel FROM workers
+    WHERE station_id=$1 AND id < $2
+    ORDER BY id DESC
+    LIMIT $3
+""")
+
+WORKER_BY_ID = q("worker_by_id", f"SELECT {WORKER_COLUMNS} FROM workers WHERE id=$1")
+
+WORKER_DETAIL = q("worker_detail", """
+    SELECT w.id, w.full_name, w.tabel, w.position, w.smena, w.photo, w.photo_file_id, s.name AS station_name
+    FROM workers w
+    JOIN stations s ON w.station_id = s.id
+    WHERE w.id=$1
+""")
+
+# Ism yoki tabel bo‘yicha qidiruv (pg_trgm GIN indekslari): $1 – qidiruv matni,
+# $2 – ILIKE uchun ekranlangan '%matn%' naqshi. Tabel to‘liq mos kelsa birinchi.
+WORKER_SEARCH_MATCH = "($1 <% w.full_name OR w.full_name ILIKE $2 OR w.tabel LIKE $2)"
+WORKER_SEARCH_RANK = "(w.tabel = $1) DESC, GREATEST(word_similarity($1, w.full_name), similarity($1, w.tabel)) DESC, w.id"
+
+WORKERS_SEARCH = q("workers_search", f"""
+    SELECT w.id, w.full_name, w.tabel, w.position, w.smena, w.station_id, s.name AS station_name
+    FROM workers w LEFT JOIN stations s ON s.id = w.station_id
+    WHERE {WORKER_SEARCH_MATCH}
+    ORDER BY {WORKER_SEARCH_RANK}
+    LIMIT $3
+""")
+
+WORKERS_SEARCH_STATION = q("workers_search_station", f"""
+    SELECT w.id, w.full_name, w.tabel
+    FROM workers w
+    WHERE w.station_id = $3 AND {WORKER_SEARCH_MATCH}
+    ORDER BY {WORKER_SEARCH_RANK}
+    LIMIT $4
+""")
+
+# Callback dagi xodim shu boshliqning bekatiga tegishlimi
+WORKER_OF_STATION = q("worker_of_station", "SELECT full_name, tabel FROM workers WHERE id=$1 AND station_id=$2")
+
+WORKER_TABEL_TAKEN = q("worker_tabel_taken", "SELECT 1 FROM workers WHERE tabel=$1")
+
+WORKERS_TABELS_TAKEN = q("workers_tabels_taken", "SELECT tabel FROM workers WHERE tabel = ANY($1::text[])")
+
+WORKER_INSERT = q("worker_insert", """
+    INSERT INTO workers(full_name, tabel, position, smena, station_id, photo)
+    VALUES($1,$2,$3,$4,$5,$6)
+""")
+
+WORKER_SET_FULL_NAME = q("worker_set_full_name", "UPDATE workers SET full_name=$1 WHERE id=$2")
+WORKER_SET_TABEL = q("worker_set_tabel", "UPDATE workers SET tabel=$1 WHERE id=$2")
+WORKER_SET_POSITION = q("worker_set_position", "UPDATE workers SET position=$1 WHERE id=$2")
+WORKER_SET_SMENA = q("worker_set_smena", "UPDATE workers SET smena=$1 WHERE id=$2")
+WORKER_SET_STATION = q("worker_set_station", "UPDATE workers SET station_id=$1 WHERE id=$2")
+WORKER_SET_PHOTO = q("worker_set_photo", "UPDATE workers SET photo=$1, photo_file_id=NULL WHERE id=$2")
+
+# URL rasmlar uchun Telegram file_id: rasm shu orada o‘zgarmagan bo‘lsagina yoziladi
+WORKERS_SET_PHOTO_FILE_IDS = q("workers_set_photo_file_ids", """
+    UPDATE workers SET photo_file_id = v.file_id
+    FROM unnest($1::int[], $2::text[], $3::text[]) AS v(id, photo, file_id)
+    WHERE workers.id = v.id AND workers.photo = v.photo
+""")
+
+WORKER_DELETE = q("worker_delete", "DELETE FROM workers WHERE id=$1")
+
+# Barcha xodimlar sahifasi: (station_id, id) kursori
+WORKERS_PAGE_NEXT = q("workers_page_next", """
+    SELECT w.id, w.station_id, s.name AS station_name, w.full_name, w.tabel, w.position, w.smena
+    FROM workers w JOIN stations s ON s.id = w.station_id
+    WHERE (w.station_id, w.id) > ($1, $2)
+    ORDER BY w.station_id, w.id
+    LIMIT $3
+""")
+
+WORKERS_PAGE_PREV = q("workers_page_prev", """
+    SELECT w.id, w.station_id, s.name AS station_name, w.full_name, w.tabel, w.position, w.smena
+    FROM workers w JOIN stations s ON s.id = w.station_id
+    WHERE (w.station_id, w.id) < ($1, $2)
+    ORDER BY w.station_id DESC, w.id DESC
+    LIMIT $3
+""")
+
+# /export: server tomonidagi kursor bilan o‘qiladi, filtrlar ixtiyoriy (NULL – hammasi)
+WORKERS_EXPORT = q("workers_export", """
+    SELECT s.name AS station_name, w.full_name, w.tabel, w.position, w.smena, w.photo
+    FROM workers w LEFT JOIN stations s ON s.id = w.station_id
+    WHERE ($1::int IS NULL OR w.station_id = $1)
+      AND ($2::text IS NULL OR w.position = $2)
+      AND ($3::text IS NULL OR w.smena = $3)
+    ORDER BY w.station_id, w.id
+""")
+
+# ================================
+# FSM holatlari (FSM_STORAGE=postgres)
+# Yozishda qator muddati o‘tgan bo‘lsa, ikkinchi ustun ham tozalanadi –
+# aks holda eski data (yoki holat) qaytib tiriladi. $3 – ttl soniyada.
+FSM_SET_STATE = q("fsm_set_state", """
+    INSERT INTO fsm_states(key, state) VALUES($1, $2)
+    ON CONFLICT (key) DO UPDATE SET
+        state=EXCLUDED.state,
+        data=CASE WHEN fsm_states.updated_at < now() - make_interval(secs => $3)
+                  THEN '{}'::jsonb ELSE fsm_states.data END,
+        updated_at=now()
+""")
+
+FSM_GET_STATE = q("fsm_get_state", """
+    SELECT state FROM fsm_states
+    WHERE key=$1 AND updated_at > now() - make_interval(secs => $2)
+""")
+
+FSM_SET_DATA = q("fsm_set_data", """
+    INSERT INTO fsm_states(key, data) VALUES($1, $2::jsonb)
+    ON CONFLICT (key) DO UPDATE SET
+        data=EXCLUDED.data,
+        state=CASE WHEN fsm_states.updated_at < now() - make_interval(secs => $3)
+                   THEN NULL ELSE fsm_states.state END,
+        updated_at=now()
+""")
+
+FSM_GET_DATA = q("fsm_get_data", """
+    SELECT data FROM fsm_states
+    WHERE key=$1 AND updated_at > now() - make_interval(secs => $2)
+""")
+
+FSM_PURGE = q("fsm_purge", """
+    DELETE FROM fsm_states
+    WHERE (state IS NULL AND data = '{}'::jsonb)
+       OR updated_at < now() - make_interval(secs => $1)
+""")
@@ -0,0 +1,161 @@
+# ================================
+# Xodimlar ro‘yxati fayllari (CSV / XLSX)
+#
+# Funksiyalar sinxron: bot ularni asyncio.to_thread orqali alohida oqimda
+# chaqiradi, shuning uchun katta fayl event loop ni to‘xtatib qo‘ymaydi.
+import csv
+import io
+
+try:
+    import openpyxl
+except ImportError:  # XLSX ixtiyoriy: o‘rnatilmagan bo‘lsa faqat CSV ishlaydi
+    openpyxl = None
+
+# Qo‘shish oqimidagi bilan bir xil variantlar
+POSITIONS = ["ДСЦП", "ДСП", "ДСПО", "ДСПЕ", "ОПЕРАТОР", "КАТТА ОПЕРАТОР", "УПП", "БЕКАТ БОШЛИҒИ"]
+SMENAS = [
+    "Кундузги", "Кечги", "ТМТ",
+    "17 режим", "17 режим кундузги 7-19", "15 - режим 8-20"
+]
+HEADER = ["F.I.O", "Tabel", "Lavozim", "Smena", "Rasm"]
+# Sarlavha qatori tabel ustunining birinchi so‘zi bilan aniqlanadi
+# ("Tabel", "Табель №", "Tabel raqami" ...)
+HEADER_TABELS = {"tabel", "табель", "табел"}
+
+_SMENA_BY_LOWER = {s.lower(): s for s in SMENAS}
+
+
+class RosterError(Exception):
+    pass
+
+
+def valid_tabel(tabel):
+    return tabel.isdigit() and len(tabel) == 5
+
+
+def is_header_tabel(tabel):
+    words = tabel.lower().replace("№", " ").split()
+    return bool(words) and words[0].strip(".:") in HEADER_TABELS
+
+
+def normalize_smena(smena):
+    return _SMENA_BY_LOWER.get(smena.lower(), smena)
+
+
+def cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return " ".join(str(value).split())
+
+
+def read_rows(filename, data):
+    name = filename.lower()
+    if name.endswith(".xlsx"):
+        if openpyxl is None:
+            raise RosterError("XLSX o‘qish uchun openpyxl o‘rnatilmagan, CSV fayl yuboring.")
+        book = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            return [list(row) for row in book.active.iter_rows(values_only=True)]
+        finally:
+            book.close()
+
+    if name.endswith(".csv") or name.endswith(".txt"):
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = data.decode("cp1251")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        return list(csv.reader(io.StringIO(text), dialect))
+
+    raise RosterError("Faqat .csv yoki .xlsx fayl yuboring.")
+
+
+def parse_roster(filename, data, max_rows):
+    # Natija: (xodimlar, xatolar). Xodim – (qator, full_name, tabel, position, smena, photo),
+    # xato – (qator, sabab).
+    workers, errors, seen = [], [], {}
+    first = True
+
+    for line_no, raw in enumerate(read_rows(filename, data), start=1):
+        raw = list(raw) + [None] * len(HEADER)
+        full_name, tabel, position, smena, photo = (cell_text(c) for c in raw[:len(HEADER)])
+        if not (full_name or tabel or position or smena or photo):
+            continue
+        # Birinchi bo‘sh bo‘lmagan qator sarlavha bo‘lishi mumkin (xato tabelli qator emas)
+        if first:
+            first = False
+            if is_header_tabel(tabel):
+                continue
+        if len(workers) + len(errors) >= max_rows:
+            raise RosterError(f"Faylda {max_rows} tadan ko‘p qator bor, bo‘lib yuboring.")
+
+        # Excel boshidagi nollarni tashlab yuboradi: 1000 -> 01000
+        if isinstance(raw[1], (int, float)) and tabel.isdigit():
+            tabel = tabel.zfill(5)
+        position = position.upper()
+        smena = normalize_smena(smena)
+
+        reasons = []
+        if not full_name:
+            reasons.append("F.I.O bo‘sh")
+        if not valid_tabel(tabel):
+            reasons.append(f"tabel «{tabel}» 5 xonali raqam emas")
+        elif tabel in seen:
+            reasons.append(f"tabel {tabel} {seen[tabel]}-qatorda ham bor")
+        if position not in POSITIONS:
+            reasons.append(f"lavozim «{position}» noma’lum")
+        if smena not in SMENAS:
+            reasons.append(f"smena «{smena}» noma’lum")
+        if photo and not photo.startswith(("http://", "https://")):
+            reasons.append("rasm http(s) link bo‘lishi kerak")
+
+        if reasons:
+            errors.append((line_no, ", ".join(reasons)))
+            continue
+        seen[tabel] = line_no
+        workers.append((line_no, full_name, tabel, position, smena, photo or None))
+
+    return workers, errors
+
+
+# ================================
+# Eksport: ustunlar importdagi tartibda, oxirida bekat nomi
+EXPORT_HEADER = HEADER + ["Bekat"]
+
+
+class RosterWriter:
+    def __init__(self, fmt, path):
+        self.fmt = fmt
+        self.path = path
+        self.count = 0
+        if fmt == "xlsx":
+            if openpyxl is None:
+                raise RosterError("XLSX yozish uchun openpyxl o‘rnatilmagan, csv tanlang.")
+            # write_only – qatorlar xotirada to‘planmaydi
+            self.book = openpyxl.Workbook(write_only=True)
+            self.sheet = self.book.create_sheet("Xodimlar")
+            self.sheet.append(EXPORT_HEADER)
+        else:
+            self.file = open(path, "w", encoding="utf-8-sig", newline="")
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(EXPORT_HEADER)
+
+    def write(self, rows):
+        for r in rows:
+            row = [r["full_name"], r["tabel"], r["position"], r["smena"], r["photo"] or "", r["station_name"] or ""]
+            if self.fmt == "xlsx":
+                self.sheet.append(row)
+            else:
+                self.csv.writerow(row)
+        self.count += len(rows)
+
+    def close(self):
+        if self.fmt == "xlsx":
+            self.book.save(self.path)
+        else:
+            self.file.close()
@@ -0,0 +1,39 @@
+# ================================
+# Holat bo‘yicha marshrutlash (state dispatch)
+#
+# aiogram handlerlarni ro‘yxatdagi tartibda birma-bir filtrdan o‘tkazadi.
+# Bu yerda esa foydalanuvchining joriy holati (raw_state) bo‘yicha handler
+# bitta dict qidiruvida topiladi, filtrlar zanjiri kerak emas.
+from aiogram.fsm.state import State
+
+
+class StateDispatch:
+    def __init__(self):
+        self.handlers = {}
+
+    def __call__(self, state, condition=None):
+        # condition – qo‘shimcha shart, masalan F.photo
+        key = state.state if isinstance(state, State) else state
+
+        def decorator(handler):
+            if key in self.handlers:
+                raise ValueError(f"{key} holati uchun handler allaqachon bor")
+            self.handlers[key] = (handler, condition)
+            return handler
+
+        return decorator
+
+    def matches(self, event, raw_state=None):
+        entry = self.handlers.get(raw_state)
+        if entry is None:
+            return False
+        condition = entry[1]
+        return condition is None or bool(condition.resolve(event))
+
+    async def dispatch(self, event, state, raw_state=None):
+        handler, _ = self.handlers[raw_state]
+        return await handler(event, state)
+
+    def attach(self, observer):
+        # Bitta umumiy handler sifatida ro‘yxatdan o‘tkazish
+        observer.register(self.dispatch, self.matches)
@@ -0,0 +1,78 @@
+# ================================
+# roster.parse_roster: baza va tarmoqsiz tekshiruvlar
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import roster  # noqa: E402
+
+
+def parse_csv(text, max_rows=100):
+    return roster.parse_roster("xodimlar.csv", text.encode("utf-8"), max_rows)
+
+
+def test_header_row_is_skipped():
+    workers, errors = parse_csv(
+        "F.I.O,Tabel,Lavozim,Smena,Rasm\n"
+        "Ali Valiyev,01234,ДСП,Кечги,\n"
+    )
+    assert workers == [(2, "Ali Valiyev", "01234", "ДСП", "Кечги", None)]
+    assert errors == []
+
+
+def test_without_header_first_row_is_data():
+    workers, errors = parse_csv("Ali Valiyev,01234,дсп,кечги,\n")
+    assert workers == [(1, "Ali Valiyev", "01234", "ДСП", "Кечги", None)]
+    assert errors == []
+
+
+def test_first_row_with_bad_tabel_is_reported():
+    workers, errors = parse_csv(
+        "Ali Valiyev,0100a,ДСП,Кечги,\n"
+        "Vali Aliyev,01001,ДСП,Кечги,\n"
+    )
+    assert [w[0] for w in workers] == [2]
+    assert errors == [(1, "tabel «0100a» 5 xonali raqam emas")]
+
+
+@pytest.mark.parametrize("text", [
+    "\n\nF.I.O,Tabel,Lavozim,Smena,Rasm\nAli Valiyev,01234,ДСП,Кечги,\n",
+    "Ф.И.О,Табель №,Лавозим,Смена,Расм\nAli Valiyev,01234,ДСП,Кечги,\n",
+])
+def test_header_after_blank_rows_or_in_cyrillic(text):
+    workers, errors = parse_csv(text)
+    assert [w[2] for w in workers] == ["01234"]
+    assert errors == []
+
+
+def test_excel_dropped_leading_zeros_are_restored():
+    openpyxl = pytest.importorskip("openpyxl")
+    book = openpyxl.Workbook()
+    book.active.append(roster.HEADER)
+    book.active.append(["Ali Valiyev", 1234, "ДСП", "Кечги", None])
+    data = io.BytesIO()
+    book.save(data)
+
+    workers, errors = roster.parse_roster("xodimlar.xlsx", data.getvalue(), 100)
+    assert workers == [(2, "Ali Valiyev", "01234", "ДСП", "Кечги", None)]
+    assert errors == []
+
+
+def test_duplicate_tabel_in_file():
+    workers, errors = parse_csv(
+        "Ali Valiyev,01234,ДСП,Кечги,\n"
+        "Vali Aliyev,01234,ДСП,Кечги,\n"
+    )
+    assert [w[0] for w in workers] == [1]
+    assert errors == [(2, "tabel 01234 1-qatorda ham bor")]
+
+
+def test_max_rows_limit():
+    rows = "".join(f"X{i},{i:05d},ДСП,Кечги,\n" for i in range(3))
+    assert len(parse_csv(rows, max_rows=3)[0]) == 3
+    with pytest.raises(roster.RosterError):
+        parse_csv(rows, max_rows=2)
@@ -0,0 +1,61 @@
+# ================================
+# Smoke test: bot haqiqiy Postgres bilan ishga tushadimi
+#
+# Faqat TEST_DB_NAME berilganda ishlaydi (baza yo‘q bo‘lsa yaratiladi).
+# Ulanish qolgan sozlamalari odatdagidek DB_USER / DB_PASSWORD / DB_HOST /
+# DB_PORT dan olinadi. Masalan:
+#   TEST_DB_NAME=info_bot_test python -m pytest tests
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+TEST_DB_NAME = os.environ.get("TEST_DB_NAME")
+
+pytestmark = pytest.mark.skipif(not TEST_DB_NAME, reason="TEST_DB_NAME berilmagan")
+
+if TEST_DB_NAME:
+    os.environ["DB_NAME"] = TEST_DB_NAME
+    os.environ.setdefault("API_TOKEN", "123456:" + "A" * 35)
+    os.environ.setdefault("GROUP_ID", "-100")
+    os.environ.setdefault("SUPERADMINS", "1")
+    # Bitta ulanish: har bir so‘rov puldan qaytarilgan ulanishni qayta oladi
+    os.environ.setdefault("DB_POOL_MIN_SIZE", "1")
+    os.environ.setdefault("DB_POOL_MAX_SIZE", "1")
+    os.environ.setdefault("FSM_STORAGE", "postgres")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def test_setup_db_and_handler_queries():
+    import info_bot
+    import queries
+
+    async def scenario():
+        await info_bot.setup_db()
+        try:
+            # Yagona ulanish sxema tayyor bo‘lgach butun registrni tayyorlagan
+            [(_, stats)] = info_bot.db.connection_stats()
+            assert stats["prepares"] == len(queries.REGISTRY)
+
+            stations = await info_bot.db.fetch(queries.STATIONS_ALL)
+            assert stations
+            station_id = stations[0]["id"]
+
+            # Ikkinchi chaqiruv puldan qaytgan ulanishda bajariladi
+            for _ in range(2):
+                await info_bot.db.fetch(queries.WORKERS_BY_STATION, station_id)
+            assert await info_bot.get_head_station(-1) is None
+
+            [(_, stats)] = info_bot.db.connection_stats()
+            assert stats["prepares"] == len(queries.REGISTRY)
+            assert stats["reused"] == 4
+
+            path, count = await info_bot.export_workers("csv", station_id, None, None)
+            os.remove(path)
+            assert count >= 0
+        finally:
+            await info_bot.db.close()
+
+    asyncio.run(scenario())